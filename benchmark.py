@@ -0,0 +1,277 @@
+"""Offline benchmark for the stock detection pipeline
+
+Serves product pages from a local HTTP server and runs the same StockChecker the monitor
+uses against them, then reports per-check latency, throughput at N concurrent workers,
+peak RSS and classification accuracy - no live sites involved.
+
+    python benchmark.py                                  # plain HTTP path, built-in pages
+    python benchmark.py --path auto --workers 1,4,8      # HTTP first, browser when needed
+    python benchmark.py --pages recorded/ --output bench_output.txt
+
+A --pages directory holds saved product pages plus a manifest.json mapping each file to
+the status it should classify as, e.g. {"shoe.html": "in_stock", "bag.html": "out_of_stock"}.
+Pages that can only be classified after a render are marked
+{"app.html": {"status": "in_stock", "browser_only": true}}; the HTTP path is expected to
+answer "unknown" for those, which is what sends the monitor to the browser.
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import stock_monitor
+from stock_monitor import CheckTimings, StockChecker
+
+
+def filler(seed):
+    """The bulk of a real product page - navigation, description, reviews and a state blob"""
+    nav = ''.join(f'<li><a href="/c/{seed}-{i}">Category {i}</a></li>' for i in range(150))
+    description = ''.join(f'<p class="pdp-copy">Feature {i}: soft-touch finish, machine washable, '
+                          f'recycled materials, fits true to size.</p>' for i in range(40))
+    reviews = ''.join(f'<div class="review"><span class="stars">{i % 5 + 1}/5</span>'
+                      f'<p>Review {i} of product {seed}. Would buy again.</p></div>' for i in range(60))
+    state = json.dumps({'product': {'id': seed, 'variants': [{'sku': f'{seed}-{i}', 'size': i} for i in range(300)]}})
+    return (f'<header><nav><ul>{nav}</ul></nav></header>',
+            f'<section class="description">{description}</section><section class="reviews">{reviews}</section>'
+            f'<script>window.__STATE__ = {state};</script>')
+
+
+def page(seed, buy_box, head=''):
+    header, body = filler(seed)
+    return (f'<!DOCTYPE html><html><head><title>Product {seed}</title>{head}</head><body>{header}'
+            f'<main><h1>Product {seed}</h1><div class="price">&pound;49.99</div>{buy_box}</main>'
+            f'{body}</body></html>')
+
+
+def builtin_pages():
+    """{name: (html, expected status, browser only)} covering each detection branch"""
+    return {
+        'in_stock_cart': (page(1, '<button class="btn btn-primary" type="submit">Add to Cart</button>'), 'in_stock', False),
+        'in_stock_bag': (page(2, '<button class="pdp-cta">Add to Bag</button>'), 'in_stock', False),
+        'out_of_stock': (page(3, '<button disabled>Sold out</button><button class="ghost">Add to Wishlist</button>'),
+                         'out_of_stock', False),
+        'grey_basket': (page(4, '<button style="background-color: rgb(204, 204, 204)" disabled>Add to Basket</button>'
+                                '<a class="wishlist">Add to Wishlist</a>'), 'out_of_stock', False),
+        'black_basket': (page(5, '<button style="background-color: rgb(17, 17, 17)">Add to Basket</button>'),
+                         'in_stock', False),
+        # The basket colour only exists in CSS, so raw HTML can't tell - needs a render
+        'css_basket': (page(6, '<button class="buy">Add to Basket</button>',
+                            head='<style>.buy { background-color: #111; color: #fff; }</style>'), 'in_stock', True),
+        # The buy box is built client-side; the label is split so the raw HTML never contains it
+        'js_heavy': (page(7, '<div id="buy-box"><div class="skeleton"></div></div>'
+                             '<script>setTimeout(function () { document.getElementById("buy-box").innerHTML = '
+                             '"<button>" + "Add to " + "Cart" + "</button>"; }, 300);</script>'), 'in_stock', True),
+    }
+
+
+def load_pages(directory):
+    """Recorded pages from a directory with a manifest.json of expected statuses"""
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        manifest = json.load(f)
+    pages = {}
+    for filename, expected in manifest.items():
+        if isinstance(expected, str):
+            expected = {'status': expected}
+        with open(os.path.join(directory, filename), encoding='utf-8', errors='replace') as f:
+            pages[os.path.splitext(filename)[0]] = (f.read(), expected['status'], expected.get('browser_only', False))
+    return pages
+
+
+def start_server(pages, delay=0):
+    """Serve every page at /<name>, ignoring the query string"""
+    bodies = {name: html.encode('utf-8') for name, (html, _, _) in pages.items()}
+
+    class PageHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out in separate writes; don't let Nagle hold the body back
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            body = bodies.get(self.path.split('?')[0].lstrip('/'))
+            if body is None:
+                self.send_error(404)
+                return
+            if delay:
+                time.sleep(delay)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PageHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class MemorySampler:
+    """Tracks the peak resident memory of this process and its browsers while a run is going"""
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        while True:
+            memory_mb = stock_monitor.process_memory_mb(os.getpid())
+            if memory_mb is not None:
+                self.peak_mb = max(self.peak_mb or 0, memory_mb)
+            if self._stop.wait(self.interval):
+                break
+
+
+def rusage_peak_mb():
+    """Peak RSS of this process and of the (exited) browsers it started, without psutil"""
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale)
+
+
+def run_check(checker, path, url):
+    timings = CheckTimings()
+    started = time.perf_counter()
+    if path == 'http':
+        status = checker.check_stock_http(url, timings)
+    elif path == 'browser':
+        status = checker.check_stock_browser(url, timings)
+    else:
+        status = checker.check_stock(url, timings)
+    return status, time.perf_counter() - started, timings
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark stock detection against locally served pages.")
+    parser.add_argument('--path', choices=['http', 'browser', 'auto'], default='http',
+                        help="Detection path to exercise (auto = HTTP first, browser fallback, as the monitor does)")
+    parser.add_argument('--pages', help="Directory of recorded pages with a manifest.json (default: built-in pages)")
+    parser.add_argument('--repeat', type=int, default=20, help="Sequential checks per page for the latency table")
+    parser.add_argument('--workers', default='1,4,16', help="Comma-separated concurrency levels for throughput")
+    parser.add_argument('--checks', type=int, default=200, help="Checks per throughput run")
+    parser.add_argument('--delay', type=float, default=0, help="Simulated server response time in seconds")
+    parser.add_argument('--warm', action='store_true',
+                        help="Re-check identical URLs so fingerprint caches hit (default: every check is cold)")
+    parser.add_argument('--output', help="Also write the report to this file")
+    parser.add_argument('--verbose', action='store_true', help="Keep the checker's debug output")
+    args = parser.parse_args(argv)
+
+    pages = load_pages(args.pages) if args.pages else builtin_pages()
+    # What a correct run returns for each page on this path
+    expected_status = {name: 'unknown' if browser_only and args.path == 'http' else status
+                       for name, (_, status, browser_only) in pages.items()}
+    worker_counts = [int(count) for count in args.workers.split(',')]
+    server = start_server(pages, args.delay)
+    base = f'http://127.0.0.1:{server.server_port}'
+    serial = itertools.count()
+
+    def url_for(name):
+        return f'{base}/{name}' if args.warm else f'{base}/{name}?run={next(serial)}'
+
+    config = {'driver_pool': {'size': max(worker_counts), 'max_uses': 50}, 'http_first': True}
+    checker = StockChecker(config)
+    report = []
+
+    def say(line=''):
+        report.append(line)
+        print(line, flush=True)
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    say(f"Detection benchmark - path={args.path}, {len(pages)} pages, "
+        f"{'warm' if args.warm else 'cold'} caches, server delay {args.delay * 1000:.0f} ms")
+
+    # Latency and accuracy, one page at a time
+    say()
+    say(f"{'page':<16}{'expected':<14}{'correct':>9}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}  slowest phases")
+    correct = total = 0
+    confusion = Counter()
+    with MemorySampler() as memory:
+        for name, expected in expected_status.items():
+            latencies = []
+            phases = Counter()
+            hits = 0
+            paths = Counter()
+            with quiet:
+                for _ in range(args.repeat):
+                    status, seconds, timings = run_check(checker, args.path, url_for(name))
+                    latencies.append(seconds)
+                    phases.update(timings.phases)
+                    paths[timings.path or args.path] += 1
+                    kind = 'error' if status.startswith('error') else status
+                    confusion[(expected, kind)] += 1
+                    hits += kind == expected
+            correct += hits
+            total += args.repeat
+            slowest = ', '.join(f"{phase} {seconds / args.repeat * 1000:.1f}"
+                                for phase, seconds in phases.most_common(3))
+            say(f"{name:<16}{expected:<14}{hits:>5}/{args.repeat:<3}"
+                f"{percentile(latencies, 0.5) * 1000:>10.1f}{percentile(latencies, 0.95) * 1000:>10.1f}"
+                f"{max(latencies) * 1000:>10.1f}  {slowest} ({', '.join(paths)})")
+
+        say()
+        say(f"Accuracy: {correct}/{total} ({correct / total:.1%})")
+        for (expected, got), count in sorted(confusion.items()):
+            if expected != got:
+                say(f"  {expected} classified as {got}: {count}")
+
+        # Throughput with N checks in flight, round-robin over the pages
+        say()
+        say(f"{'workers':>8}{'checks':>8}{'seconds':>10}{'checks/s':>10}{'accuracy':>10}")
+        names = list(pages)
+        for workers in worker_counts:
+            jobs = [names[index % len(names)] for index in range(args.checks)]
+            with quiet, ThreadPoolExecutor(max_workers=workers) as executor:
+                started = time.perf_counter()
+                results = list(executor.map(lambda name: (name, run_check(checker, args.path, url_for(name))[0]), jobs))
+                elapsed = time.perf_counter() - started
+            right = sum(status == expected_status[name] for name, status in results)
+            say(f"{workers:>8}{len(results):>8}{elapsed:>10.2f}{len(results) / elapsed:>10.1f}"
+                f"{right / len(results):>10.1%}")
+
+        with quiet:
+            checker.close()
+
+    own_peak, browser_peak = rusage_peak_mb()
+    say()
+    if memory.peak_mb is not None:
+        say(f"Peak RSS (process + browsers, sampled): {memory.peak_mb:.0f} MB")
+    if own_peak is not None:
+        say(f"Peak RSS (getrusage): process {own_peak:.0f} MB, largest browser process {browser_peak:.0f} MB")
+
+    server.shutdown()
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write('\n'.join(report) + '\n')
+    return 0 if correct == total else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
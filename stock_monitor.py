@@ -1,37 +1,2558 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
 import threading
+import asyncio
 import time
 import json
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import OrderedDict, Counter
+from concurrent.futures import ThreadPoolExecutor, Future, InvalidStateError
 import os
 import re
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, WebDriverException
+import argparse
+import signal
+import urllib.request
+import hashlib
+import hmac
+import secrets
+import heapq
+import itertools
+import uuid
+import codecs
+import zlib
+import http.client
+import logging
+import multiprocessing
+import queue
+import sqlite3
+from logging.handlers import RotatingFileHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
+from html.parser import HTMLParser
+from urllib.parse import urlsplit, urljoin, parse_qs
 
-class StockMonitor:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Stock Monitor")
-        self.root.geometry("900x700")
+# tkinter and selenium are imported lazily: headless daemons never need the former, and
+# sites served by the HTTP path never need the latter
+tk = ttk = messagebox = None
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+
+# Waits until the DOM has been quiet for quietMs (or maxMs has passed), then evaluates a
+# compiled StockRule in one pass: selector predicates query just their selector, and all
+# text-only predicates share a single text-node walk. Each candidate element is tested for
+# the predicate's enabled, visible, attribute and background colour conditions. When the
+# page's fingerprint matches the one passed in, detection is skipped and {unchanged: true}
+# comes back instead.
+DETECTION_SCRIPT = """
+var done = arguments[arguments.length - 1];
+var quietMs = arguments[0], maxMs = arguments[1], previousFingerprint = arguments[2];
+var spec = arguments[3];
+var start = Date.now(), lastMutation = Date.now();
+
+// FNV-1a over the visible text plus the state of every control, so a button turning
+// from grey to black changes it even when no text does
+function fingerprint() {
+    var root = document.body || document.documentElement;
+    var parts = [root.innerText || ''];
+    var controls = root.querySelectorAll('button, input, [disabled], [aria-disabled]');
+    for (var i = 0; i < controls.length; i++) {
+        var el = controls[i];
+        parts.push(el.tagName + (el.disabled ? ':d' : '') + ':' + el.getAttribute('aria-disabled') +
+                   ':' + el.className + ':' + window.getComputedStyle(el).backgroundColor);
+    }
+    var text = parts.join('|'), hash = 0x811c9dc5;
+    for (var j = 0; j < text.length; j++) {
+        hash ^= text.charCodeAt(j);
+        hash = Math.imul(hash, 0x01000193) >>> 0;
+    }
+    return hash.toString(16) + ':' + text.length;
+}
+
+function isDark(color, max) {
+    var rgb = (color || '').match(/\\d+/g);
+    return color.indexOf('rgb') !== -1 && rgb && rgb.length >= 3 &&
+        +rgb[0] < max && +rgb[1] < max && +rgb[2] < max;
+}
+
+function isVisible(el, style) {
+    return style.display !== 'none' && style.visibility !== 'hidden' &&
+        +style.opacity !== 0 && el.getClientRects().length > 0;
+}
+
+function satisfies(el, p) {
+    if (p.enabled && (el.disabled || el.matches(':disabled') || el.hasAttribute('disabled') ||
+                      el.getAttribute('aria-disabled') === 'true')) return false;
+    for (var name in p.attributes) {
+        var value = p.attributes[name];
+        if (!el.hasAttribute(name) || (value !== null && el.getAttribute(name) !== value)) return false;
+    }
+    if (p.visible || p.background_max_rgb !== null) {
+        var style = window.getComputedStyle(el);
+        if (p.visible && !isVisible(el, style)) return false;
+        if (p.background_max_rgb !== null && !isDark(style.backgroundColor, p.background_max_rgb)) return false;
+    }
+    return true;
+}
+
+function detect(spec) {
+    // One text-node walk serves every predicate that has no selector
+    var keywords = [], byText = {};
+    spec.in_stock.concat(spec.out_of_stock).forEach(function (p) {
+        if (!p.selector && !byText.hasOwnProperty(p.text)) {
+            byText[p.text] = [];
+            keywords.push(p.text);
+        }
+    });
+    if (keywords.length) {
+        var walker = document.createTreeWalker(document.documentElement, NodeFilter.SHOW_TEXT);
+        var node;
+        while ((node = walker.nextNode())) {
+            var text = node.nodeValue.toLowerCase();
+            for (var k = 0; k < keywords.length; k++) {
+                if (text.indexOf(keywords[k]) !== -1 && node.parentElement) {
+                    byText[keywords[k]].push(node.parentElement);
+                }
+            }
+        }
+    }
+
+    function candidates(p) {
+        if (!p.selector) return byText[p.text];
+        var found = [], nodes = document.querySelectorAll(p.selector);
+        for (var i = 0; i < nodes.length; i++) {
+            if (!p.text || (nodes[i].textContent || '').toLowerCase().indexOf(p.text) !== -1) {
+                found.push(nodes[i]);
+            }
+        }
+        return found;
+    }
+
+    function firstMatch(predicates) {
+        for (var i = 0; i < predicates.length; i++) {
+            var elements = candidates(predicates[i]);
+            for (var j = 0; j < elements.length; j++) {
+                if (satisfies(elements[j], predicates[i])) {
+                    return predicates[i].selector || predicates[i].text;
+                }
+            }
+        }
+        return null;
+    }
+
+    function anyIn(source, texts) {
+        for (var i = 0; i < texts.length; i++) {
+            if (source.indexOf(texts[i]) !== -1) return true;
+        }
+        return false;
+    }
+
+    var inStock = firstMatch(spec.in_stock);
+    var verdict = {in_stock: inStock, out_of_stock: inStock ? null : firstMatch(spec.out_of_stock),
+                   waited: Date.now() - start};
+    if (!verdict.in_stock && !verdict.out_of_stock) {
+        // Page source fallback, searched here so the (often multi-MB) source never leaves the browser
+        var source = document.documentElement.outerHTML.toLowerCase();
+        verdict.fallback = {in_stock: anyIn(source, spec.fallback.in_stock),
+                            out_of_stock: anyIn(source, spec.fallback.out_of_stock)};
+    }
+    return verdict;
+}
+
+var observer = new MutationObserver(function () { lastMutation = Date.now(); });
+observer.observe(document.documentElement,
+                 {childList: true, subtree: true, attributes: true, characterData: true});
+
+(function poll() {
+    var now = Date.now();
+    // 'interactive' is enough: lean sessions return at DOMContentLoaded and block slow resources
+    var settled = document.readyState !== 'loading' && now - lastMutation >= quietMs;
+    if (settled || now - start >= maxMs) {
+        observer.disconnect();
+        var print = fingerprint();
+        if (print === previousFingerprint) {
+            done({unchanged: true, fingerprint: print, waited: Date.now() - start});
+            return;
+        }
+        var verdict = detect(spec);
+        verdict.fingerprint = print;
+        done(verdict);
+    } else {
+        setTimeout(poll, 100);
+    }
+})();
+"""
+
+
+# Blocks that change on every request (nonces, timestamps, tracking) without the product changing,
+# plus the <input>/<meta> tags that may carry a per-request token
+VOLATILE_START = re.compile(rb'<(script|style)\b|<!--|<(input|meta)\b', re.I)
+VOLATILE_END = {b'script': re.compile(rb'</script\s*>', re.I), b'style': re.compile(rb'</style\s*>', re.I),
+                None: re.compile(rb'-->')}
+VOLATILE_TAG = re.compile(rb'\btype\s*=\s*["\']?hidden\b|\b(?:name|property)\s*=\s*["\']?[\w:.-]*'
+                          rb'(?:csrf|token|nonce|request[-_]?id)', re.I)
+FALLBACK_KEYWORDS = re.compile(rb'add to (cart|bag|wishlist)', re.I)
+
+
+# Query keys that only ever track a click - never ones like ref=, which some shops use for the product id
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|gclid|gbraid|wbraid|fbclid|msclkid|mc_cid|mc_eid|_ga)$', re.I)
+
+
+def normalize_url(url):
+    """Canonical form of a product URL, so the same page watched twice is checked once"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    port = parts.port
+    if port and (scheme, port) not in (('http', 80), ('https', 443)):
+        host = f'{host}:{port}'
+    query = sorted(pair for pair in parts.query.split('&')
+                   if pair and not TRACKING_PARAMS.match(pair.split('=', 1)[0]))
+    normalized = f"{scheme}://{host}{parts.path or '/'}"
+    return normalized + '?' + '&'.join(query) if query else normalized
+
+
+class HtmlFingerprint:
+    """Hashes the parts of a page that can affect its stock status, a chunk at a time as it arrives
+    
+    Volatile blocks, hidden inputs and token-bearing tags are left out, and each run of
+    whitespace counts as one space. Only a short carry-over is kept between chunks, so memory
+    doesn't grow with the page. Text that changes by itself ("12 people viewing") still
+    changes the fingerprint.
+    """
+    # Enough of a chunk's end to hold a tag or keyword split across two chunks
+    CARRY = 64
+    # Longest <input>/<meta> tag held back waiting for its '>'
+    TAG_LIMIT = 4096
+    
+    def __init__(self):
+        self.digest = hashlib.blake2b(digest_size=16)
+        self.keywords = set()
+        self._carry = b''
+        self._raw_tail = b''
+        # Closing pattern of the volatile block we're inside, if any
+        self._end = None
+        self._started = False
+        self._space = False
+        
+    def update(self, chunk):
+        # Scripts are left out of the hash, but the page source fallback can still see their keywords
+        raw = self._raw_tail + chunk
+        self.keywords.update(match.lower() for match in FALLBACK_KEYWORDS.findall(raw))
+        self._raw_tail = raw[-self.CARRY:]
+        self._scan(self._carry + chunk, final=False)
+        
+    def hexdigest(self):
+        """Finish the page and return its fingerprint"""
+        self._scan(self._carry, final=True)
+        self._carry = b''
+        self.digest.update(b'|'.join(sorted(self.keywords)))
+        return self.digest.hexdigest()
+        
+    def _scan(self, data, final):
+        position = 0
+        while True:
+            if self._end is not None:
+                match = self._end.search(data, position)
+                if match is None:
+                    # Still inside the block - keep just enough to spot its end
+                    self._carry = b'' if final else data[max(position, len(data) - self.CARRY):]
+                    return
+                self._end = None
+                self._space = True
+                position = match.end()
+                continue
+            match = VOLATILE_START.search(data, position)
+            if match is not None and match.end() == len(data) and not final:
+                # "<script" at the very end might yet turn out to be "<scripts"
+                self._emit(data[position:match.start()])
+                self._carry = data[match.start():]
+                return
+            if match is None:
+                end = len(data) if final else max(position, len(data) - self.CARRY)
+                self._emit(data[position:end])
+                self._carry = data[end:]
+                return
+            if match.group(2):
+                close = data.find(b'>', match.end())
+                if close < 0:
+                    if not final and len(data) - match.start() < self.TAG_LIMIT:
+                        # Wait for the rest of the tag
+                        self._emit(data[position:match.start()])
+                        self._carry = data[match.start():]
+                        return
+                    close = match.end() - 1
+                if VOLATILE_TAG.search(data, match.start(), close):
+                    self._emit(data[position:match.start()])
+                    self._space = True
+                else:
+                    self._emit(data[position:close + 1])
+                position = close + 1
+                continue
+            self._emit(data[position:match.start()])
+            self._end = VOLATILE_END[match.group(1) and match.group(1).lower()]
+            position = match.end()
+            
+    def _emit(self, data):
+        if not data:
+            return
+        if data[:1].isspace():
+            self._space = True
+        tokens = data.split()
+        if tokens:
+            if self._started and self._space:
+                self.digest.update(b' ')
+            self.digest.update(b' '.join(tokens))
+            self._started = True
+            self._space = data[-1:].isspace()
+
+
+def parse_rgb(color):
+    """Parse a CSS colour (rgb()/rgba(), #hex or 'black') into an (r, g, b) tuple"""
+    color = color.strip().lower()
+    if 'rgb' in color:
+        values = re.findall(r'\d+', color)
+        if len(values) >= 3:
+            return int(values[0]), int(values[1]), int(values[2])
+    elif color.startswith('#'):
+        digits = color.split()[0][1:]
+        if len(digits) == 3:
+            digits = ''.join(c * 2 for c in digits)
+        if len(digits) != 6:
+            return None
+        try:
+            return int(digits[0:2], 16), int(digits[2:4], 16), int(digits[4:6], 16)
+        except ValueError:
+            return None
+    elif color.split()[:1] == ['black']:
+        return 0, 0, 0
+    return None
+
+
+# Built-in rule, used for any site without its own: the original cart/bag/basket/wishlist chain
+DEFAULT_RULE = {
+    'name': 'default',
+    'in_stock': [
+        {'text': 'add to cart'},
+        {'text': 'add to bag'},
+        # Basket buttons stay on the page when out of stock, greyed out - only a black one counts
+        {'text': 'add to basket', 'enabled': True, 'visible': True, 'background_max_rgb': 50},
+    ],
+    'out_of_stock': [
+        {'text': 'add to wishlist'},
+    ],
+    # Page source substrings to fall back on when no element matched
+    'fallback': {'in_stock': ['add to cart', 'add to bag'], 'out_of_stock': ['add to wishlist']},
+}
+
+
+class SimpleSelector:
+    """The subset of CSS selectors the HTML parser can match: tag#id.class[attr][attr=value]"""
+    PATTERN = re.compile(r'^([a-zA-Z][\w-]*|\*)?((?:[#.][\w-]+)*)((?:\[[^\]]+\])*)$')
+    ATTRIBUTE = re.compile(r'\[\s*([\w:-]+)\s*(?:=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\]\s]*)))?\s*\]')
+    
+    def __init__(self, tag, ids, classes, attributes):
+        self.tag = tag
+        self.ids = ids
+        self.classes = classes
+        self.attributes = attributes
+        
+    @classmethod
+    def compile(cls, selector):
+        """Return a list of SimpleSelectors (one per comma group), or None if any group is too complex"""
+        compiled = []
+        for group in selector.split(','):
+            match = cls.PATTERN.match(group.strip())
+            if not match:
+                return None
+            tag = match.group(1) if match.group(1) not in (None, '*') else None
+            ids = [value for kind, value in re.findall(r'([#.])([\w-]+)', match.group(2)) if kind == '#']
+            classes = [value for kind, value in re.findall(r'([#.])([\w-]+)', match.group(2)) if kind == '.']
+            attributes = {}
+            for attribute in re.findall(r'\[[^\]]+\]', match.group(3)):
+                parsed = cls.ATTRIBUTE.fullmatch(attribute)
+                if not parsed:
+                    return None
+                name, *values = parsed.groups()
+                value = next((v for v in values if v is not None), None)
+                attributes[name.lower()] = value
+            compiled.append(cls(tag and tag.lower(), ids, classes, attributes))
+        return compiled
+        
+    def matches(self, tag, attrs):
+        if self.tag and tag != self.tag:
+            return False
+        if any(attrs.get('id') != value for value in self.ids):
+            return False
+        if self.classes:
+            classes = attrs.get('class', '').split()
+            if any(name not in classes for name in self.classes):
+                return False
+        for name, value in self.attributes.items():
+            if name not in attrs or (value is not None and attrs[name] != value):
+                return False
+        return True
+
+
+class RulePredicate:
+    """One element test: where to look (selector and/or text) and what the element must satisfy"""
+    def __init__(self, spec, kind):
+        self.kind = kind
+        self.selector = spec.get('selector')
+        self.text = spec.get('text', '').lower() or None
+        if not self.selector and not self.text:
+            raise ValueError("each predicate needs a 'selector' or a 'text'")
+        self.enabled = spec.get('enabled', False)
+        self.visible = spec.get('visible', False)
+        self.background_max_rgb = spec.get('background_max_rgb')
+        self.attributes = {name.lower(): value for name, value in spec.get('attributes', {}).items()}
+        self.simple = SimpleSelector.compile(self.selector) if self.selector else None
+        
+    def to_browser(self):
+        return {'selector': self.selector, 'text': self.text, 'enabled': self.enabled, 'visible': self.visible,
+                'background_max_rgb': self.background_max_rgb, 'attributes': self.attributes}
+        
+    def describe(self):
+        return self.selector or repr(self.text)
+        
+    def selects(self, tag, attrs):
+        return any(selector.matches(tag, attrs) for selector in self.simple)
+        
+    def check_html(self, attrs, hidden):
+        """True/False if raw HTML settles it, None if it takes computed CSS to know"""
+        if self.enabled and ('disabled' in attrs or attrs.get('aria-disabled') == 'true'):
+            return False
+        if self.visible and hidden:
+            return False
+        for name, value in self.attributes.items():
+            if name not in attrs or (value is not None and attrs[name] != value):
+                return False
+        if self.background_max_rgb is not None:
+            match = re.search(r'background(?:-color)?\s*:\s*([^;]+)', attrs.get('style', ''), re.I)
+            if match is None:
+                return None
+            rgb = parse_rgb(match.group(1))
+            return rgb is not None and all(value < self.background_max_rgb for value in rgb)
+        return True
+
+
+class StockRule:
+    """A compiled detection rule for one or more sites"""
+    def __init__(self, spec):
+        self.name = spec.get('name') or ', '.join(spec.get('hosts', [])) or 'rule'
+        self.hosts = [host.lower() for host in spec.get('hosts', [])]
+        self.in_stock = [RulePredicate(p, 'in_stock') for p in spec.get('in_stock', [])]
+        self.out_of_stock = [RulePredicate(p, 'out_of_stock') for p in spec.get('out_of_stock', [])]
+        fallback = spec.get('fallback', {})
+        self.fallback_in_stock = [text.lower() for text in fallback.get('in_stock', [])]
+        self.fallback_out_of_stock = [text.lower() for text in fallback.get('out_of_stock', [])]
+        # Searched case-insensitively over raw page bytes, so no lowercased copy of the page is made
+        self._fallback_in_stock = self._phrases(self.fallback_in_stock)
+        self._fallback_out_of_stock = self._phrases(self.fallback_out_of_stock)
+        
+        predicates = self.in_stock + self.out_of_stock
+        self.text_predicates = [p for p in predicates if not p.selector]
+        self.selector_predicates = [p for p in predicates if p.selector]
+        # Selectors beyond SimpleSelector need a real DOM
+        self.http_capable = all(p.simple for p in self.selector_predicates)
+        # Sent to the detection script as-is on every check
+        self.browser_spec = {'in_stock': [p.to_browser() for p in self.in_stock],
+                             'out_of_stock': [p.to_browser() for p in self.out_of_stock],
+                             'fallback': {'in_stock': self.fallback_in_stock,
+                                          'out_of_stock': self.fallback_out_of_stock}}
+        
+    def applies_to(self, host):
+        return any(host == h or host.endswith('.' + h) for h in self.hosts)
+        
+    def _phrases(self, texts):
+        if not texts:
+            return None
+        return re.compile(b'|'.join(re.escape(text.encode('utf-8')) for text in texts), re.I)
+        
+    def fallback(self, page_source):
+        """Page source substring fallback over the raw HTML bytes, as (in_stock, out_of_stock)"""
+        return (bool(self._fallback_in_stock and self._fallback_in_stock.search(page_source)),
+                bool(self._fallback_out_of_stock and self._fallback_out_of_stock.search(page_source)))
+
+
+class RuleSet:
+    """Per-site rules from config, compiled once and picked by URL host"""
+    def __init__(self, specs):
+        self.rules = []
+        for spec in specs:
+            try:
+                self.rules.append(StockRule(spec))
+            except (ValueError, TypeError, AttributeError) as e:
+                print(f"Rule error in {spec.get('name') or spec.get('hosts')}: {e}")
+        self.default = StockRule(DEFAULT_RULE)
+        self._by_host = {}
+        
+    def rule_for(self, url):
+        host = (urlsplit(url).hostname or '').lower()
+        rule = self._by_host.get(host)
+        if rule is None:
+            rule = next((r for r in self.rules if r.applies_to(host)), self.default)
+            self._by_host[host] = rule
+        return rule
+
+
+def stock_fingerprint(*evidence):
+    """Hash of what detection found - matched predicates and fallback hits - so a page only counts
+    as changed when its stock-relevant state does, not when a token or banner changes"""
+    return hashlib.blake2b(repr(evidence).encode(), digest_size=8).hexdigest()
+
+
+def classify_stock(has_in_stock, has_out_of_stock):
+    """Turn the detected buttons into a stock status"""
+    # In stock signals win over out of stock ones
+    if has_in_stock:
+        return 'in_stock'
+    elif has_out_of_stock:
+        return 'out_of_stock'
+    else:
+        return 'unknown'
+
+
+class FingerprintCache:
+    """Bounded LRU of page fingerprints, validators and the status they classified as"""
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+            
+    def put(self, key, **fields):
+        with self._lock:
+            self._entries[key] = fields
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class HttpFetcher:
+    """Fetches pages over pooled keep-alive HTTP connections"""
+    REDIRECTS = (301, 302, 303, 307, 308)
+    
+    READ_CHUNK = 64 * 1024
+    
+    def __init__(self, timeout=15, max_idle_per_host=4, max_bytes=None):
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self.max_bytes = max_bytes
+        self._idle = {}
+        self._lock = threading.Lock()
+        
+    def fetch(self, url, headers=None, max_redirects=5, on_data=None):
+        """GET a URL, following redirects; returns (status, headers, body bytearray, final_url, truncated)
+        
+        Bodies are streamed and decompressed in chunks, and cut short after max_bytes. Each
+        decompressed chunk of the final response is also passed to on_data, if given.
+        """
+        for _ in range(max_redirects + 1):
+            parts = urlsplit(url)
+            if parts.scheme not in ('http', 'https'):
+                raise ValueError(f"Unsupported URL scheme: {parts.scheme}")
+            key = (parts.scheme, parts.hostname, parts.port)
+            path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+            
+            status, response_headers, body, truncated = self._request(key, path, headers or {}, on_data)
+            location = response_headers.get('location')
+            if status in self.REDIRECTS and location:
+                url = urljoin(url, location)
+                continue
+            return status, response_headers, body, url, truncated
+        raise ValueError("Too many redirects")
+        
+    def _request(self, key, path, headers, on_data=None):
+        request_headers = {
+            'User-Agent': USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.9',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+        }
+        request_headers.update(headers)
+        
+        conn, reused = self._get_connection(key)
+        try:
+            conn.request('GET', path, headers=request_headers)
+            response = conn.getresponse()
+        except (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if not reused:
+                raise
+            # The server dropped an idle keep-alive connection - retry once on a fresh one
+            conn, _ = self._get_connection(key, fresh=True)
+            try:
+                conn.request('GET', path, headers=request_headers)
+                response = conn.getresponse()
+            except:
+                conn.close()
+                raise
+        except:
+            conn.close()
+            raise
+            
+        response_headers = {name.lower(): value for name, value in response.getheaders()}
+        try:
+            body, truncated = self._read_body(response, response_headers.get('content-encoding', '').lower(),
+                                              on_data if response.status not in self.REDIRECTS else None)
+        except:
+            conn.close()
+            raise
+        if truncated or response.will_close:
+            # Whatever is left of a cut-short body would poison the connection
+            conn.close()
+        else:
+            self._put_connection(key, conn)
+        return response.status, response_headers, body, truncated
+        
+    def _read_body(self, response, encoding, on_data=None):
+        """Read and decompress a body chunk by chunk, stopping once max_bytes are decoded"""
+        decompressor = None
+        if encoding == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        # One growing buffer, rather than a list of chunks joined into a second copy at the end
+        body = bytearray()
+        while True:
+            chunk = response.read(self.READ_CHUNK)
+            if not chunk:
+                break
+            if encoding == 'deflate' and decompressor is None:
+                # Servers send both zlib-wrapped and raw deflate under this name
+                wrapped = len(chunk) > 1 and chunk[0] & 0x0F == 8 and (chunk[0] << 8 | chunk[1]) % 31 == 0
+                decompressor = zlib.decompressobj(zlib.MAX_WBITS if wrapped else -zlib.MAX_WBITS)
+            remaining = self.max_bytes - len(body) if self.max_bytes else 0
+            if decompressor is not None:
+                data = decompressor.decompress(chunk, remaining)
+                over = bool(decompressor.unconsumed_tail)
+            else:
+                data = chunk[:remaining] if remaining else chunk
+                over = remaining and len(chunk) > remaining
+            body += data
+            if on_data is not None:
+                on_data(data)
+            if over or (self.max_bytes and len(body) >= self.max_bytes):
+                return body, True
+        return body, False
+        
+    def _get_connection(self, key, fresh=False):
+        if not fresh:
+            with self._lock:
+                idle = self._idle.get(key)
+                if idle:
+                    return idle.pop(), True
+        scheme, host, port = key
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout), False
+        return http.client.HTTPConnection(host, port, timeout=self.timeout), False
+        
+    def _put_connection(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+        
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+
+class StockPageParser(HTMLParser):
+    """Evaluates a StockRule against server-rendered HTML, as far as raw HTML allows"""
+    VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+                 'meta', 'param', 'source', 'track', 'wbr'}
+    
+    def __init__(self, rule):
+        super().__init__(convert_charrefs=True)
+        self.rule = rule
+        # Each open element: [tag, attrs, hidden, selector predicates it matched, its text so far]
+        self.stack = []
+        self.in_stock = []
+        self.out_of_stock = []
+        # Predicates that matched an element whose state depends on CSS (e.g. background colour)
+        self.unverified = False
+        # The end of the current text run, so a phrase split across two feed() calls still matches
+        self._longest_text = max((len(p.text) for p in rule.text_predicates), default=0)
+        self._text_tail = ''
+        
+    def handle_starttag(self, tag, attrs):
+        self._text_tail = ''
+        attrs = {name: (value or '') for name, value in attrs}
+        style = attrs.get('style', '').lower().replace(' ', '')
+        parent_hidden = self.stack[-1][2] if self.stack else False
+        hidden = (parent_hidden or 'hidden' in attrs or 'display:none' in style
+                  or tag in ('script', 'style', 'template', 'noscript'))
+        matched = [p for p in self.rule.selector_predicates if p.selects(tag, attrs)]
+        if tag in self.VOID_TAGS:
+            # No content, so only attribute tests apply
+            for predicate in matched:
+                self._evaluate(predicate, attrs, hidden, '')
+            return
+        self.stack.append([tag, attrs, hidden, matched, []])
+        
+    def handle_endtag(self, tag):
+        self._text_tail = ''
+        # Tolerate sloppy markup: pop back to the matching open tag, if any
+        for depth in range(len(self.stack) - 1, -1, -1):
+            if self.stack[depth][0] == tag:
+                for entry in reversed(self.stack[depth:]):
+                    self._close(entry)
+                del self.stack[depth:]
+                return
+                
+    def handle_data(self, data):
+        text = data.lower()
+        for entry in self.stack:
+            if entry[3]:
+                entry[4].append(text)
+        if self.rule.text_predicates:
+            attrs, hidden = (self.stack[-1][1], self.stack[-1][2]) if self.stack else ({}, False)
+            run = self._text_tail + text
+            for predicate in self.rule.text_predicates:
+                # Only matches that reach into the new text - the rest were seen last time
+                if run.find(predicate.text, max(0, len(self._text_tail) - len(predicate.text) + 1)) >= 0:
+                    self._evaluate(predicate, attrs, hidden, run)
+            self._text_tail = run[-(self._longest_text - 1):] if self._longest_text > 1 else ''
+                    
+    def close(self):
+        super().close()
+        for entry in reversed(self.stack):
+            self._close(entry)
+        self.stack = []
+        
+    def _close(self, entry):
+        for predicate in entry[3]:
+            self._evaluate(predicate, entry[1], entry[2], ''.join(entry[4]))
+            
+    def _evaluate(self, predicate, attrs, hidden, text):
+        if predicate.text and predicate.text not in text:
+            return
+        result = predicate.check_html(attrs, hidden)
+        if result is None:
+            self.unverified = True
+        elif result:
+            getattr(self, predicate.kind).append(predicate.describe())
+
+
+class CheckTimings:
+    """Wall-clock seconds spent in each phase of one check"""
+    def __init__(self):
+        self.phases = {}
+        self.path = None
+        # Stock fingerprint from the path that produced the status (see stock_fingerprint)
+        self.fingerprint = None
+        
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+            
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0) + seconds
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, Prometheus style"""
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    
+    def __init__(self):
+        self.counts = [0] * len(self.BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+        
+    def observe(self, value):
+        for index, bound in enumerate(self.BUCKETS):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+        
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.BUCKETS, self.counts):
+            total += count
+            yield bound, total
+
+
+class Metrics:
+    """Per-check counters and latency histograms, with a rolling JSON log of every check"""
+    def __init__(self, log_file=None, log_max_bytes=5 * 1024 * 1024, log_backups=3):
+        self._lock = threading.Lock()
+        self.status_counts = Counter()
+        self.error_counts = Counter()
+        self.path_counts = Counter()
+        self.check_latency = {}
+        self.phase_latency = {}
+        self.alert_latency = Histogram()
+        self.alert_counts = Counter()
+        
+        self.log = None
+        if log_file:
+            self.log = logging.getLogger('stock_monitor.checks')
+            self.log.setLevel(logging.INFO)
+            self.log.propagate = False
+            if not self.log.handlers:
+                handler = RotatingFileHandler(log_file, maxBytes=log_max_bytes, backupCount=log_backups)
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                self.log.addHandler(handler)
+                
+    def record_check(self, target, url, status, total, timings):
+        kind = 'error' if status.startswith('error') else status
+        with self._lock:
+            self.status_counts[kind] += 1
+            if kind == 'error':
+                # 'error: Browser error - ...' -> 'Browser error'
+                self.error_counts[status[len('error: '):].split(' - ')[0][:40]] += 1
+            self.path_counts[timings.path or 'none'] += 1
+            self.check_latency.setdefault(target.id, Histogram()).observe(total)
+            for phase, seconds in timings.phases.items():
+                self.phase_latency.setdefault(phase, Histogram()).observe(seconds)
+                
+        if self.log:
+            self.log.info(json.dumps({
+                'time': datetime.now().isoformat(timespec='seconds'),
+                'target': target.id, 'name': target.name, 'url': url,
+                'status': status, 'path': timings.path, 'total': round(total, 4),
+                'phases': {phase: round(seconds, 4) for phase, seconds in timings.phases.items()},
+            }))
+            
+    def forget_target(self, target_id):
+        """Drop a removed target's latency series, so it stops showing up in scrapes"""
+        with self._lock:
+            self.check_latency.pop(target_id, None)
+            
+    def record_alert(self, seconds, alerts, ok):
+        with self._lock:
+            self.alert_latency.observe(seconds)
+            self.alert_counts['sent' if ok else 'failed'] += alerts
+            
+    def render_prometheus(self, targets):
+        """Text exposition format for a /metrics scrape"""
+        lines = []
+        with self._lock:
+            lines.append('# TYPE stock_checks_total counter')
+            for kind, count in sorted(self.status_counts.items()):
+                lines.append(f'stock_checks_total{{status="{kind}"}} {count}')
+            lines.append('# TYPE stock_check_errors_total counter')
+            for error, count in sorted(self.error_counts.items()):
+                lines.append(f'stock_check_errors_total{{type="{self._escape(error)}"}} {count}')
+            lines.append('# TYPE stock_check_path_total counter')
+            for path, count in sorted(self.path_counts.items()):
+                lines.append(f'stock_check_path_total{{path="{path}"}} {count}')
+            lines.append('# TYPE stock_alerts_total counter')
+            for outcome, count in sorted(self.alert_counts.items()):
+                lines.append(f'stock_alerts_total{{outcome="{outcome}"}} {count}')
+                
+            lines.append('# TYPE stock_check_duration_seconds histogram')
+            for target_id, histogram in sorted(self.check_latency.items()):
+                target = targets.get(target_id)
+                labels = f'target="{target_id}",name="{self._escape(target.name if target else "")}"'
+                lines.extend(self._histogram_lines('stock_check_duration_seconds', labels, histogram))
+            lines.append('# TYPE stock_check_phase_seconds histogram')
+            for phase, histogram in sorted(self.phase_latency.items()):
+                lines.extend(self._histogram_lines('stock_check_phase_seconds', f'phase="{phase}"', histogram))
+            lines.append('# TYPE stock_alert_send_seconds histogram')
+            lines.extend(self._histogram_lines('stock_alert_send_seconds', '', self.alert_latency))
+        return '\n'.join(lines) + '\n'
+        
+    def snapshot(self, targets):
+        """The same numbers as a JSON-friendly dict"""
+        def summary(histogram):
+            return {'count': histogram.count, 'sum': round(histogram.sum, 4),
+                    'mean': round(histogram.sum / histogram.count, 4) if histogram.count else None,
+                    'buckets': {str(bound): count for bound, count in histogram.cumulative()}}
+            
+        with self._lock:
+            return {
+                'checks': dict(self.status_counts),
+                'errors': dict(self.error_counts),
+                'paths': dict(self.path_counts),
+                'alerts': dict(self.alert_counts),
+                'targets': {target_id: dict(summary(histogram), url=targets[target_id].url if target_id in targets else None)
+                            for target_id, histogram in self.check_latency.items()},
+                'phases': {phase: summary(histogram) for phase, histogram in self.phase_latency.items()},
+                'alert_send': summary(self.alert_latency),
+            }
+            
+    def _histogram_lines(self, name, labels, histogram):
+        prefix = labels + ',' if labels else ''
+        for bound, count in histogram.cumulative():
+            yield f'{name}_bucket{{{prefix}le="{bound}"}} {count}'
+        yield f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}'
+        suffix = f'{{{labels}}}' if labels else ''
+        yield f'{name}_sum{suffix} {histogram.sum:.6f}'
+        yield f'{name}_count{suffix} {histogram.count}'
+        
+    def _escape(self, value):
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+class StatusHistory:
+    """Status history in SQLite, stored as one row per run of identical results
+    
+    Checks are buffered in memory and written in batches by a background thread. A run is
+    extended in place while a target keeps reporting the same status, so a month of
+    minute-by-minute checks of a stable page is a handful of rows.
+    """
+    STATUSES = ['in_stock', 'out_of_stock', 'unknown', 'error']
+    
+    def __init__(self, path, flush_interval=5, batch_size=500, retention_days=90):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retention_days = retention_days
+        
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._pending = []
+        self._runs = {}
+        self._target_ids = {}
+        self._wake = threading.Event()
+        self._closed = False
+        
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        self.db.execute('PRAGMA journal_mode = WAL')
+        self.db.execute('PRAGMA synchronous = NORMAL')
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS targets (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                host TEXT NOT NULL DEFAULT ''
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                target INTEGER NOT NULL,
+                status INTEGER NOT NULL,
+                first_seen INTEGER NOT NULL,
+                last_seen INTEGER NOT NULL,
+                checks INTEGER NOT NULL DEFAULT 1
+            );
+            CREATE INDEX IF NOT EXISTS runs_target_time ON runs (target, first_seen);
+            CREATE INDEX IF NOT EXISTS runs_time ON runs (first_seen);
+            CREATE TABLE IF NOT EXISTS alerts (
+                target INTEGER NOT NULL,
+                sent_at INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS alerts_target_time ON alerts (target, sent_at);
+        ''')
+        for target_id, key, host in self.db.execute('SELECT id, key, host FROM targets'):
+            self._target_ids[key] = (target_id, host)
+        # Pick up each target's open run so a restart keeps extending it
+        for key, rowid, status, first_seen, last_seen, checks in self.db.execute('''
+                SELECT t.key, r.rowid, r.status, r.first_seen, r.last_seen, r.checks
+                FROM targets t JOIN runs r ON r.rowid = (
+                    SELECT rowid FROM runs WHERE target = t.id ORDER BY first_seen DESC, rowid DESC LIMIT 1)'''):
+            self._runs[key] = [rowid, status, first_seen, last_seen, checks]
+            
+        self.compact()
+        self._thread = threading.Thread(target=self._writer, daemon=True, name='history')
+        self._thread.start()
+        
+    def _code(self, status):
+        kind = 'error' if status.startswith('error') else status
+        return self.STATUSES.index(kind) if kind in self.STATUSES else self.STATUSES.index('unknown')
+        
+    def record(self, target_id, url, status, at=None):
+        """Queue one check result - cheap enough to call from the event loop"""
+        with self._lock:
+            self._pending.append(('check', target_id, url, self._code(status), int(at or time.time())))
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+                
+    def record_alert(self, target_id, sent_at=None):
+        """Queue an alert email, so the rate limit survives a restart"""
+        with self._lock:
+            self._pending.append(('alert', target_id, None, None, int(sent_at or time.time())))
+            
+    def load_state(self):
+        """{target_id: (last status, last email time)} as of the last run"""
+        state = {}
+        with self._db_lock:
+            for key, run in self._runs.items():
+                state[key] = [self.STATUSES[run[1]], None]
+            for key, sent_at in self.db.execute('''
+                    SELECT t.key, MAX(a.sent_at) FROM alerts a JOIN targets t ON t.id = a.target
+                    GROUP BY a.target'''):
+                state.setdefault(key, [None, None])[1] = sent_at
+        return {key: tuple(value) for key, value in state.items()}
+        
+    def restocks_per_site(self, days=30):
+        """{host: restock count} - moves from out_of_stock to in_stock over the last N days
+        
+        error and unknown runs are skipped, so a failed check between two in stock runs isn't a restock.
+        """
+        self.flush()
+        since = int(time.time() - days * 86400)
+        in_stock = self.STATUSES.index('in_stock')
+        out_of_stock = self.STATUSES.index('out_of_stock')
+        with self._db_lock:
+            rows = self.db.execute('''
+                SELECT t.host, COUNT(*) FROM (
+                    SELECT target, status, first_seen,
+                           LAG(status) OVER (PARTITION BY target ORDER BY first_seen, rowid) AS previous
+                    FROM runs WHERE status IN (?, ?)
+                ) r JOIN targets t ON t.id = r.target
+                WHERE r.status = ? AND r.previous = ? AND r.first_seen >= ?
+                GROUP BY t.host ORDER BY COUNT(*) DESC''',
+                (in_stock, out_of_stock, in_stock, out_of_stock, since)).fetchall()
+        return dict(rows)
+        
+    def history(self, target_id, days=30):
+        """[(status, first_seen, last_seen, checks)] for one target, oldest first"""
+        self.flush()
+        since = int(time.time() - days * 86400)
+        with self._db_lock:
+            rows = self.db.execute('''
+                SELECT r.status, r.first_seen, r.last_seen, r.checks FROM runs r
+                JOIN targets t ON t.id = r.target
+                WHERE t.key = ? AND r.last_seen >= ? ORDER BY r.first_seen, r.rowid''',
+                                   (target_id, since)).fetchall()
+        return [(self.STATUSES[status], first_seen, last_seen, checks)
+                for status, first_seen, last_seen, checks in rows]
+                
+    def compact(self, retention_days=None):
+        """Drop runs and alerts older than the retention period, keeping each target's latest run"""
+        retention_days = retention_days or self.retention_days
+        if not retention_days:
+            return
+        cutoff = int(time.time() - retention_days * 86400)
+        with self._db_lock:
+            keep = [run[0] for run in self._runs.values()]
+            with self.db:
+                self.db.execute('CREATE TEMP TABLE IF NOT EXISTS keep_runs (id INTEGER PRIMARY KEY)')
+                self.db.execute('DELETE FROM keep_runs')
+                self.db.executemany('INSERT INTO keep_runs VALUES (?)', [(rowid,) for rowid in keep])
+                self.db.execute('DELETE FROM runs WHERE last_seen < ? AND rowid NOT IN (SELECT id FROM keep_runs)',
+                                (cutoff,))
+                self.db.execute('DELETE FROM alerts WHERE sent_at < ?', (cutoff,))
+            self.db.execute('PRAGMA incremental_vacuum')
+            
+    def flush(self):
+        """Write everything queued so far in one transaction"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+            
+        with self._db_lock:
+            with self.db:
+                extended = {}
+                for kind, key, url, status, at in pending:
+                    target = self._target(key, url)
+                    if kind == 'alert':
+                        self.db.execute('INSERT INTO alerts VALUES (?, ?)', (target, at))
+                        continue
+                        
+                    run = self._runs.get(key)
+                    if run is not None and run[1] == status:
+                        run[3] = max(run[3], at)
+                        run[4] += 1
+                        extended[run[0]] = run
+                    else:
+                        cursor = self.db.execute('INSERT INTO runs VALUES (?, ?, ?, ?, 1)', (target, status, at, at))
+                        self._runs[key] = [cursor.lastrowid, status, at, at, 1]
+                # Many checks of one run in a batch become a single update
+                self.db.executemany('UPDATE runs SET last_seen = ?, checks = ? WHERE rowid = ?',
+                                    [(run[3], run[4], rowid) for rowid, run in extended.items()])
+                                    
+    def _target(self, key, url):
+        """Row id for a target, kept up to date with the host it points at"""
+        host = (urlsplit(url).hostname or '').lower() if url else None
+        known = self._target_ids.get(key)
+        if known is not None and (host is None or known[1] == host):
+            return known[0]
+        self.db.execute('INSERT INTO targets (key, host) VALUES (?, ?) '
+                        'ON CONFLICT (key) DO UPDATE SET host = excluded.host', (key, host or ''))
+        target = self.db.execute('SELECT id FROM targets WHERE key = ?', (key,)).fetchone()[0]
+        self._target_ids[key] = (target, host or '')
+        return target
+        
+    def _writer(self):
+        last_compact = time.time()
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                if time.time() - last_compact > 86400:
+                    last_compact = time.time()
+                    self.compact()
+            except Exception as e:
+                print(f"History error: {e}")
+                
+    def close(self):
+        """Write out anything still queued and close the database"""
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        try:
+            self.flush()
+        finally:
+            with self._db_lock:
+                self.db.close()
+
+
+REDACTED = '********'
+
+
+def load_control_token(path):
+    """The shared secret for the control API, generated into path on first use"""
+    try:
+        with open(path) as f:
+            token = f.read().strip()
+        if token:
+            return token
+    except OSError:
+        pass
+    token = secrets.token_urlsafe(32)
+    # Readable by the owner only - anyone holding it can change where alerts go
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(token + '\n')
+    return token
+
+
+def control_token_path(config_file):
+    """Where the control token lives unless the config says otherwise - beside the config file"""
+    return os.path.join(os.path.dirname(os.path.abspath(config_file)), 'control_token')
+
+
+def public_config(config):
+    """The config as served to an attached GUI - never the SMTP password"""
+    settings = {key: value for key, value in config.items() if key != 'tabs'}
+    if settings.get('email_password'):
+        settings['email_password'] = REDACTED
+    return settings
+
+
+def start_control_server(engine, port, host='127.0.0.1', token=None):
+    """Serve metrics and, given a token, a small JSON control API for attaching a GUI, on a background thread
+    
+    GET /metrics, /metrics.json
+    With "Authorization: Bearer <token>":
+    GET /targets, /config,
+        /history/restocks?days=30 (restocks per site), /history/<id>?days=30 (one target's runs)
+    POST /targets (add), /targets/<id> (update; "running" starts/stops), /config (save settings)
+    DELETE /targets/<id>
+    POST bodies must be application/json, which a web page can't send cross-origin without a preflight.
+    """
+    class ControlHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                self._reply(engine.metrics.render_prometheus(engine.targets).encode(), 'text/plain; version=0.0.4')
+            elif self.path == '/metrics.json':
+                self._reply_json(engine.metrics.snapshot(engine.targets))
+            elif not self._authorized():
+                return
+            elif self.path == '/targets':
+                self._reply_json([engine.target_state(target) for target in list(engine.targets.values())])
+            elif self.path == '/config':
+                self._reply_json(public_config(engine.config))
+            elif self.path.startswith('/history/') and engine.history is not None:
+                parts = urlsplit(self.path)
+                try:
+                    days = float(parse_qs(parts.query).get('days', ['30'])[0])
+                except ValueError as e:
+                    self.send_error(400, str(e))
+                    return
+                name = parts.path[len('/history/'):]
+                if name == 'restocks':
+                    self._reply_json(engine.history.restocks_per_site(days))
+                else:
+                    self._reply_json([{'status': status, 'from': first_seen, 'to': last_seen, 'checks': checks}
+                                      for status, first_seen, last_seen, checks in engine.history.history(name, days)])
+            else:
+                self.send_error(404)
+                
+        def do_POST(self):
+            if not self._authorized():
+                return
+            if self.headers.get('Content-Type', '').split(';')[0].strip().lower() != 'application/json':
+                self.send_error(415, "Expected application/json")
+                return
+            try:
+                data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if not isinstance(data, dict):
+                    raise ValueError("Expected a JSON object")
+                if self.path == '/targets':
+                    self._validate_target(data)
+                    target = engine.add_target(data.get('url') or '', data.get('interval') or 60, data.get('name'))
+                    self._reply_json(engine.target_state(target))
+                elif self.path.startswith('/targets/'):
+                    target_id = self.path[len('/targets/'):]
+                    if target_id not in engine.targets:
+                        raise KeyError(target_id)
+                    self._validate_target(data)
+                    engine.update_target(target_id, url=data.get('url'), interval=data.get('interval'),
+                                         name=data.get('name'))
+                    if data.get('running') is True:
+                        engine.start_target(target_id)
+                    elif data.get('running') is False:
+                        engine.stop_target(target_id)
+                    self._reply_json(engine.target_state(engine.targets[target_id]))
+                elif self.path == '/config':
+                    settings = {key: value for key, value in data.items() if key != 'tabs'}
+                    # The GUI only ever saw the placeholder; keep the real password
+                    if settings.get('email_password') == REDACTED:
+                        del settings['email_password']
+                    # Applied the same way as an edit to the file, then saved
+                    changed = engine.update_settings(settings)
+                    engine.save_config()
+                    self._reply_json({'saved': True, 'changed': sorted(changed)})
+                else:
+                    self.send_error(404)
+            except KeyError:
+                self.send_error(404)
+            except (ValueError, TypeError) as e:
+                self.send_error(400, str(e))
+                
+        def do_DELETE(self):
+            if not self._authorized():
+                return
+            target_id = self.path[len('/targets/'):]
+            if not self.path.startswith('/targets/') or target_id not in engine.targets:
+                self.send_error(404)
+                return
+            engine.remove_target(target_id)
+            self._reply_json({'removed': True})
+            
+        def _authorized(self):
+            """Control routes only exist when a token is set, and need it on every request"""
+            if token is None:
+                self.send_error(404)
+                return False
+            if not hmac.compare_digest(self.headers.get('Authorization', ''), f'Bearer {token}'):
+                self.send_error(401)
+                return False
+            return True
+            
+        def _validate_target(self, data):
+            interval = data.get('interval')
+            if interval is not None and (type(interval) is not int or interval <= 0):
+                raise ValueError("interval must be a positive integer")
+            for key in ('url', 'name'):
+                if data.get(key) is not None and not isinstance(data[key], str):
+                    raise ValueError(f"{key} must be a string")
+                    
+        def _reply_json(self, data):
+            self._reply(json.dumps(data, indent=2).encode(), 'application/json')
+            
+        def _reply(self, body, content_type):
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            
+        def log_message(self, format, *args):
+            pass
+            
+    server = ThreadingHTTPServer((host, port), ControlHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Metrics available at http://{host}:{server.server_port}/metrics")
+    if token is not None:
+        print(f"Control API enabled at http://{host}:{server.server_port}")
+    return server
+
+
+class ResourceBlocker:
+    """Chooses which requests a lean browser should drop, per site"""
+    EXTENSIONS = {
+        'images': ['png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'svg', 'ico', 'bmp'],
+        'media': ['mp4', 'webm', 'm3u8', 'ts', 'mp3', 'ogg', 'wav', 'mov'],
+        'fonts': ['woff', 'woff2', 'ttf', 'otf', 'eot'],
+    }
+    TRACKERS = ['google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com',
+                'adservice.google.com', 'connect.facebook.net', 'hotjar.com', 'clarity.ms', 'segment.com',
+                'segment.io', 'optimizely.com', 'nr-data.net', 'js-agent.newrelic.com', 'criteo.com',
+                'criteo.net', 'taboola.com', 'outbrain.com', 'scorecardresearch.com', 'quantserve.com',
+                'analytics.tiktok.com', 'bat.bing.com', 'ct.pinterest.com', 'sc-static.net', 'adnxs.com']
+    
+    def __init__(self, config):
+        lean = config.get('lean_browser', {})
+        self.enabled = lean.get('enabled', True)
+        self.categories = lean.get('block', ['images', 'media', 'fonts', 'trackers'])
+        # {'host': ['images', ...]} re-allows some categories; a plain list re-allows everything
+        allow = lean.get('allow_domains', {})
+        if isinstance(allow, list):
+            allow = {domain: list(self.EXTENSIONS) + ['trackers'] for domain in allow}
+        self.allow = {domain.lower(): set(categories) for domain, categories in allow.items()}
+        self._patterns = {}
+        
+    def _category_patterns(self, category):
+        if category == 'trackers':
+            return [f'*://*.{domain}/*' for domain in self.TRACKERS] + [f'*://{domain}/*' for domain in self.TRACKERS]
+        patterns = []
+        for extension in self.EXTENSIONS.get(category, []):
+            patterns += [f'*.{extension}', f'*.{extension}?*']
+        return patterns
+        
+    def patterns_for(self, host):
+        """Blocked URL patterns for a page on this host"""
+        if not self.enabled:
+            return ()
+        allowed = set()
+        for domain, categories in self.allow.items():
+            if host == domain or host.endswith('.' + domain):
+                allowed |= categories
+        categories = tuple(category for category in self.categories if category not in allowed)
+        if categories not in self._patterns:
+            patterns = []
+            for category in categories:
+                patterns += self._category_patterns(category)
+            self._patterns[categories] = tuple(patterns)
+        return self._patterns[categories]
+        
+    def apply(self, pooled, host):
+        """Point the session's request blocking at this host, skipping the round-trip if unchanged"""
+        patterns = self.patterns_for(host)
+        if patterns == pooled.blocked:
+            return
+        try:
+            if pooled.blocked is None:
+                pooled.driver.execute_cdp_cmd('Network.enable', {})
+            pooled.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(patterns)})
+            pooled.blocked = patterns
+        except Exception as e:
+            print(f"DEBUG: Could not set up request blocking: {e}")
+            pooled.blocked = patterns
+
+
+class PooledDriver:
+    """A warm Chrome session plus the bookkeeping the pool needs"""
+    def __init__(self, driver, lean=True):
+        self.driver = driver
+        # Whether it was launched with the lean profile (eager page loads)
+        self.lean = lean
+        self.uses = 0
+        self.created = time.time()
+        self.last_used = time.time()
+        # Blocked URL patterns currently applied to this session
+        self.blocked = None
+
+
+class DriverPool:
+    """Keeps headless Chrome sessions warm and lends them out to monitor threads"""
+    def __init__(self, size=2, max_uses=50, max_memory_mb=600, health_check_after=30, lean=True):
+        self.size = max(1, size)
+        self.lean = lean
+        self.max_uses = max_uses
+        self.max_memory_mb = max_memory_mb
+        self.health_check_after = health_check_after
+        
+        self._idle = []
+        self._count = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        
+    def _create_driver(self, lean):
+        """Launch a new headless Chrome session"""
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.chrome.options import Options
+        
+        # Setup Chrome options
+        chrome_options = Options()
+        chrome_options.add_argument('--headless')
+        chrome_options.add_argument('--no-sandbox')
+        chrome_options.add_argument('--disable-dev-shm-usage')
+        chrome_options.add_argument('--disable-gpu')
+        chrome_options.add_argument('--window-size=1920,1080')
+        chrome_options.add_argument(f'--user-agent={USER_AGENT}')
+        chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+        chrome_options.add_experimental_option('useAutomationExtension', False)
+        
+        if lean:
+            # Hand the page back at DOMContentLoaded - the detection script waits for the DOM itself
+            chrome_options.page_load_strategy = 'eager'
+            chrome_options.add_argument('--mute-audio')
+            chrome_options.add_argument('--autoplay-policy=user-gesture-required')
+            chrome_options.add_argument('--disable-extensions')
+            chrome_options.add_argument('--disable-background-networking')
+        
+        # Get the directory where this script is located
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        chromedriver_path = os.path.join(script_dir, 'chromedriver.exe')
+        
+        # Check if chromedriver exists in script directory
+        if os.path.exists(chromedriver_path):
+            print(f"Using ChromeDriver at: {chromedriver_path}")
+            service = Service(chromedriver_path)
+            driver = webdriver.Chrome(service=service, options=chrome_options)
+        else:
+            # Try without explicit path (will search in PATH/system32)
+            print("ChromeDriver not found in script directory, trying system PATH...")
+            driver = webdriver.Chrome(options=chrome_options)
+        
+        driver.set_page_load_timeout(30)
+        driver.set_script_timeout(15)
+        return driver
+        
+    def acquire(self, timeout=None):
+        """Borrow a driver, launching a new one if the pool isn't full yet"""
+        while True:
+            with self._cond:
+                pooled = None
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Driver pool is closed")
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+                    if self._count < self.size:
+                        # Reserve a slot, launch outside the lock
+                        self._count += 1
+                        lean = self.lean
+                        break
+                    if not self._cond.wait(timeout):
+                        raise TimeoutError("Timed out waiting for a free browser")
+                    
+            if pooled is None:
+                try:
+                    return PooledDriver(self._create_driver(lean), lean)
+                except:
+                    self._forget()
+                    raise
+                    
+            # Sessions that sat idle for a while may have died underneath us
+            if time.time() - pooled.last_used < self.health_check_after or self._is_healthy(pooled):
+                return pooled
+            print("DEBUG: Discarding dead browser session")
+            self._discard(pooled)
+            
+    def release(self, pooled, broken=False):
+        """Return a driver to the pool, recycling it if it is worn out or crashed"""
+        pooled.uses += 1
+        pooled.last_used = time.time()
+        
+        recycle = broken or self._closed or pooled.lean != self.lean
+        if not recycle and self.max_uses and pooled.uses >= self.max_uses:
+            recycle = True
+        if not recycle and self.max_memory_mb:
+            memory_mb = self._memory_mb(pooled)
+            if memory_mb is not None and memory_mb > self.max_memory_mb:
+                print(f"DEBUG: Recycling browser using {memory_mb:.0f} MB")
+                recycle = True
+                
+        if recycle:
+            self._discard(pooled)
+            return
+            
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+            
+    def set_lean(self, lean):
+        """Switch the lean profile on or off; sessions launched the other way are replaced"""
+        with self._cond:
+            if lean == self.lean:
+                return
+            self.lean = lean
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._discard(pooled)
+            
+    def close(self):
+        """Quit every idle session; busy ones are quit when they come back"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for pooled in idle:
+            self._discard(pooled)
+            
+    def _is_healthy(self, pooled):
+        """Cheap round-trip to make sure the browser still responds"""
+        try:
+            pooled.driver.execute_script('return 1')
+            return True
+        except:
+            return False
+            
+    def _memory_mb(self, pooled):
+        """Approximate memory used by a browser session, in MB"""
+        try:
+            import psutil
+            process = psutil.Process(pooled.driver.service.process.pid)
+            total = sum(p.memory_info().rss for p in [process] + process.children(recursive=True))
+            return total / (1024 * 1024)
+        except:
+            pass
+        # Fall back to the page's JS heap when psutil isn't available
+        try:
+            heap = pooled.driver.execute_script(
+                'return window.performance && performance.memory ? performance.memory.usedJSHeapSize : null')
+            return heap / (1024 * 1024) if heap else None
+        except:
+            return None
+            
+    def _discard(self, pooled):
+        """Quit a session and free its slot"""
+        try:
+            pooled.driver.quit()
+        except:
+            pass
+        self._forget()
+        
+    def _forget(self):
+        with self._cond:
+            self._count -= 1
+            self._cond.notify()
+
+
+def total_memory_mb():
+    """Physical memory of this machine in MB, or None if it can't be determined"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        pass
+    try:
+        import ctypes
+        
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                        ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                        ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                        ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                        ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+        
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullTotalPhys / (1024 * 1024)
+    except:
+        pass
+    return None
+
+
+def default_worker_count():
+    """Size the check worker pool to the machine's CPUs and RAM"""
+    # Checks spend most of their time waiting on the network, so oversubscribe the CPUs
+    workers = (os.cpu_count() or 2) * 4
+    memory_mb = total_memory_mb()
+    if memory_mb:
+        workers = min(workers, int(memory_mb // 256))
+    return max(2, min(workers, 64))
+
+
+def default_browser_count():
+    """How many headless Chrome sessions this machine can comfortably keep warm"""
+    browsers = os.cpu_count() or 2
+    memory_mb = total_memory_mb()
+    if memory_mb:
+        # Budget roughly 500 MB per browser out of half the RAM
+        browsers = min(browsers, int(memory_mb * 0.5 // 500))
+    return max(1, browsers)
+
+
+def default_process_count():
+    """How many worker processes to run, one per core as far as RAM allows"""
+    processes = os.cpu_count() or 2
+    memory_mb = total_memory_mb()
+    if memory_mb:
+        # Each worker is a Python process plus its own browser - budget about 1 GB
+        processes = min(processes, int(memory_mb * 0.5 // 1000))
+    return max(1, processes)
+
+
+def default_target_id(url, occurrence=0):
+    """A stable id for a config entry that has none, so its history survives a restart
+    
+    Derived from the URL alone, so adding or removing other entries doesn't change it;
+    occurrence tells apart entries that watch the same URL.
+    """
+    key = normalize_url(url) + (f'#{occurrence}' if occurrence else '')
+    return hashlib.blake2b(key.encode(), digest_size=4).hexdigest()
+
+
+class MonitorTarget:
+    """One watched URL and its scheduling state"""
+    def __init__(self, target_id, url='', interval=60, name='', enabled=True):
+        self.id = target_id
+        self.url = url
+        self.interval = interval
+        self.name = name
+        # Whether a headless daemon should start this target on launch
+        self.enabled = enabled
+        self.running = False
+        self.checking = False
+        self.task = None
+        self.next_due = None
+        self.schedule_seq = None
+        self.last_checked = None
+        
+        # Adaptive scheduling state
+        self.current_interval = None
+        self.error_count = 0
+        self.stable_count = 0
+        self.fingerprint = None
+        
+    def to_config(self):
+        return {'id': self.id, 'name': self.name, 'url': self.url, 'interval': self.interval,
+                'enabled': self.enabled}
+
+
+class RestockWindow:
+    """A recurring time of day when a site tends to restock, e.g. weekdays 08:55-09:30"""
+    DAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+    
+    def __init__(self, spec):
+        self.days = self._parse_days(spec.get('days', 'mon-sun'))
+        self.start = datetime.strptime(spec['start'], '%H:%M').time()
+        self.end = datetime.strptime(spec['end'], '%H:%M').time()
+        self.interval = spec.get('interval')
+        self.hosts = [host.lower() for host in spec.get('hosts', [])]
+        
+    def _parse_days(self, days):
+        """Accept 'mon-fri', 'sat,sun' or a list of day names"""
+        if isinstance(days, str):
+            days = [part.strip() for part in days.lower().split(',')]
+        result = set()
+        for part in days:
+            part = part.strip().lower()
+            if '-' in part:
+                first, last = (self.DAYS.index(day.strip()[:3]) for day in part.split('-'))
+                result.update(day % 7 for day in range(first, last + 1 if last >= first else last + 8))
+            else:
+                result.add(self.DAYS.index(part[:3]))
+        return result
+        
+    def applies_to(self, host):
+        return not self.hosts or any(host == h or host.endswith('.' + h) for h in self.hosts)
+        
+    def active(self, now):
+        if now.weekday() not in self.days:
+            return False
+        if self.start <= self.end:
+            return self.start <= now.time() < self.end
+        # Window runs past midnight
+        return now.time() >= self.start or now.time() < self.end
+        
+    def next_start(self, now):
+        """The next time this window opens after now"""
+        for offset in range(8):
+            day = now.date() + timedelta(days=offset)
+            if day.weekday() in self.days:
+                opens = datetime.combine(day, self.start)
+                if opens > now:
+                    return opens
+        return None
+
+
+class AdaptiveSchedule:
+    """Works out when each target should next be checked from how its checks have gone"""
+    def __init__(self, config):
+        adaptive = config.get('adaptive', {})
+        self.enabled = adaptive.get('enabled', True)
+        self.floor = adaptive.get('floor', 15)
+        self.error_backoff_max = adaptive.get('error_backoff_max', 1800)
+        self.stable_after = adaptive.get('stable_after', 5)
+        self.relax_factor = adaptive.get('relax_factor', 1.25)
+        self.max_relax = adaptive.get('max_relax', 4)
+        self.windows = [RestockWindow(spec) for spec in config.get('restock_windows', [])]
+        
+    def next_due(self, target, status, changed, now):
+        """Update the target's adaptive state and return the timestamp of its next check"""
+        base = target.interval
+        if not self.enabled:
+            return now + base
+            
+        floor = min(base, self.floor)
+        current = target.current_interval or base
+        if status.startswith('error'):
+            # Back off exponentially while a site is failing or timing out
+            target.error_count += 1
+            target.stable_count = 0
+            interval = min(base * 2 ** target.error_count, max(base, self.error_backoff_max))
+        elif changed:
+            # The status, or what detection found on the page, moved - look again soon
+            target.error_count = 0
+            target.stable_count = 0
+            interval = floor
+        else:
+            target.error_count = 0
+            target.stable_count += 1
+            if status == 'out_of_stock' and target.stable_count >= self.stable_after:
+                # Long-stable out of stock pages relax slowly past the configured interval
+                interval = min(max(current, floor) * self.relax_factor, base * self.max_relax)
+            else:
+                # Drift back up to the configured interval after a change
+                interval = min(max(current, floor) * self.relax_factor, base)
+        target.current_interval = interval
+        
+        due = now + interval
+        if status.startswith('error'):
+            return due
+            
+        # Restock windows tighten the schedule, and pull the next check forward to their start
+        host = (urlsplit(target.url).hostname or '').lower()
+        moment = datetime.fromtimestamp(now)
+        for window in self.windows:
+            if not window.applies_to(host):
+                continue
+            if window.active(moment):
+                due = min(due, now + (window.interval or floor))
+            else:
+                opens = window.next_start(moment)
+                if opens is not None:
+                    due = min(due, opens.timestamp())
+        return due
+
+
+class AlertDispatcher:
+    """Queues in-stock alerts and sends them as digests over one long-lived SMTP session"""
+    def __init__(self, config, last_email_sent=None, coalesce_window=5, max_retries=5, metrics=None,
+                 history=None):
+        self.config = config
+        self.metrics = metrics
+        self.history = history
+        self.last_email_sent = last_email_sent if last_email_sent is not None else {}
+        self.coalesce_window = coalesce_window
+        self.max_retries = max_retries
+        
+        self._queue = asyncio.Queue()
+        # One thread owns the SMTP session, so it is never used concurrently
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='smtp')
+        self._smtp = None
+        self._smtp_key = None
+        
+    def enqueue(self, target_id, name, url):
+        """Queue an alert - must be called from the engine's event loop"""
+        self._queue.put_nowait({'target_id': target_id, 'name': name, 'url': url,
+                                'time': datetime.now()})
+        
+    async def run(self):
+        """Collect alerts into digests and deliver them, forever"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            
+            # A restock often hits many monitors at once - wait briefly and send one digest
+            deadline = loop.time() + self.coalesce_window
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+                    
+            alerts = self._rate_limit(batch)
+            if alerts:
+                await self._deliver(alerts)
+                
+    def _rate_limit(self, batch):
+        """Drop alerts for monitors that already emailed within email_interval"""
+        now = time.time()
+        email_interval = self.config.get('email_interval', 300)
+        alerts = {}
+        for alert in batch:
+            last_sent = self.last_email_sent.get(alert['target_id'])
+            if last_sent is not None and now - last_sent < email_interval:
+                continue
+            alerts.setdefault(alert['target_id'], alert)
+        return list(alerts.values())
+        
+    async def _deliver(self, alerts):
+        """Send a digest, retrying with exponential backoff"""
+        if not self.config.get('email_from') or not self.config.get('email_password'):
+            print(f"Email error: email settings not configured, dropping {len(alerts)} alert(s)")
+            return
+            
+        loop = asyncio.get_running_loop()
+        delay = 1
+        for attempt in range(1, self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                await loop.run_in_executor(self._executor, self._send, alerts)
+                if self.metrics:
+                    self.metrics.record_alert(time.perf_counter() - started, len(alerts), True)
+                sent_at = time.time()
+                for alert in alerts:
+                    self.last_email_sent[alert['target_id']] = sent_at
+                    if self.history:
+                        self.history.record_alert(alert['target_id'], sent_at)
+                return
+            except Exception as e:
+                if self.metrics:
+                    self.metrics.record_alert(time.perf_counter() - started, len(alerts), False)
+                print(f"Email error (attempt {attempt}/{self.max_retries}): {str(e)}")
+                if attempt < self.max_retries:
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 60)
+        print(f"Email error: giving up on {len(alerts)} alert(s)")
+        
+    def _build_message(self, alerts):
+        msg = MIMEMultipart()
+        msg['From'] = self.config['email_from']
+        msg['To'] = self.config['email_to']
+        
+        if len(alerts) == 1:
+            alert = alerts[0]
+            msg['Subject'] = f"Stock Alert - {alert['name']}"
+            body = f"""
+            Product is now IN STOCK!
+            
+            Monitor: {alert['name']}
+            URL: {alert['url']}
+            Time: {alert['time'].strftime('%Y-%m-%d %H:%M:%S')}
+            
+            Check it out now!
+            """
+        else:
+            msg['Subject'] = f"Stock Alert - {len(alerts)} products in stock"
+            lines = [f"{alert['time'].strftime('%H:%M:%S')}  {alert['name']}\n    {alert['url']}"
+                     for alert in alerts]
+            body = "These products are now IN STOCK!\n\n" + "\n\n".join(lines) + "\n\nCheck them out now!\n"
+            
+        msg.attach(MIMEText(body, 'plain'))
+        return msg
+        
+    def _send(self, alerts):
+        """Send one digest - runs on the SMTP thread"""
+        msg = self._build_message(alerts)
+        server = self._connection()
+        try:
+            server.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, OSError):
+            # Force a fresh session on the retry
+            self._disconnect()
+            raise
+            
+    def _connection(self):
+        """Reuse the open SMTP session if it is still alive, otherwise log in again"""
+        key = (self.config.get('smtp_server', 'smtp.gmail.com'), self.config.get('smtp_port', 587),
+               self.config['email_from'], self.config['email_password'])
+        if self._smtp is not None and key == self._smtp_key:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+        self._disconnect()
+        
+        server = smtplib.SMTP(key[0], key[1], timeout=30)
+        try:
+            server.starttls()
+            server.login(key[2], key[3])
+        except:
+            server.close()
+            raise
+        self._smtp = server
+        self._smtp_key = key
+        return server
+        
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except:
+                self._smtp.close()
+            self._smtp = None
+            
+    def close(self):
+        """Log out of the SMTP session"""
+        self._executor.submit(self._disconnect)
+        self._executor.shutdown(wait=False)
+
+
+class StockChecker:
+    """Runs single stock checks - HTTP first, then a pooled browser - with its own caches"""
+    def __init__(self, config):
+        self.config = config
+        pool_config = self.config.get('driver_pool', {})
+        self.driver_pool = DriverPool(size=pool_config.get('size') or default_browser_count(),
+                                      max_uses=pool_config.get('max_uses', 50),
+                                      max_memory_mb=pool_config.get('max_memory_mb', 600),
+                                      lean=self.config.get('lean_browser', {}).get('enabled', True))
+        self.resource_blocker = ResourceBlocker(self.config)
+        self.rules = RuleSet(self.config.get('rules', []))
+        self.http_fetcher = HttpFetcher(max_bytes=self.config.get('max_page_bytes', 4 * 1024 * 1024))
+        self.fingerprints = FingerprintCache(self.config.get('fingerprint_cache_size', 5000))
+        self.domain_paths = {}
+        
+    def apply_settings(self, changed, rules=None):
+        """Rebuild what was compiled from config settings that just changed (rules may come precompiled)"""
+        if 'rules' in changed:
+            self.rules = rules if rules is not None else RuleSet(self.config.get('rules', []))
+        if 'lean_browser' in changed:
+            self.resource_blocker = ResourceBlocker(self.config)
+            self.driver_pool.set_lean(self.config.get('lean_browser', {}).get('enabled', True))
+        if 'max_page_bytes' in changed:
+            self.http_fetcher.max_bytes = self.config.get('max_page_bytes', 4 * 1024 * 1024)
+        if changed & {'rules', 'max_page_bytes'}:
+            # Cached statuses and the path each site settled on came from the old settings
+            self.fingerprints.clear()
+            self.domain_paths.clear()
+            
+    def check(self, url, timings=None):
+        """Check a URL and return (status, stock fingerprint from the path that ran)"""
+        timings = timings or CheckTimings()
+        status = self.check_stock(url, timings)
+        return status, timings.fingerprint
+        
+
+    def check_stock(self, url, timings=None):
+        """Check stock over plain HTTP first, escalating to Selenium only when needed"""
+        timings = timings or CheckTimings()
+        host = (urlsplit(url).hostname or '').lower()
+        rule = self.rules.rule_for(url)
+        
+        if self.config.get('http_first', True) and rule.http_capable and self.use_http_path(host):
+            timings.path = 'http'
+            status = self.check_stock_http(url, timings)
+            if status != 'unknown' and not status.startswith('error'):
+                self.domain_paths[host] = ('http', time.time())
+                return status
+            print(f"DEBUG: HTTP check for {host} gave '{status}', falling back to browser")
+            # Whatever that path last classified no longer describes the page
+            self.fingerprints.discard(('http', url))
+            
+            timings.path = 'http+browser'
+            status = self.check_stock_browser(url, timings)
+            if status != 'unknown' and not status.startswith('error'):
+                # The raw HTML wasn't enough for this site - go straight to the browser next time
+                self.domain_paths[host] = ('browser', time.time())
+            return status
+            
+        timings.path = 'browser'
+        return self.check_stock_browser(url, timings)
+        
+    def use_http_path(self, host):
+        """Decide whether a site is worth trying without a browser"""
+        js_only = [domain.lower() for domain in self.config.get('js_only_domains', [])]
+        if any(host == domain or host.endswith('.' + domain) for domain in js_only):
+            return False
+        path, since = self.domain_paths.get(host, ('http', 0))
+        if path == 'browser':
+            # Re-probe now and then in case the site started rendering server-side
+            return time.time() - since > self.config.get('http_reprobe_after', 3600)
+        return True
         
-        self.config_file = "config.json"
-        self.monitoring_threads = {}
+    def check_stock_http(self, url, timings=None):
+        """Check stock from the server-rendered HTML, without a browser"""
+        timings = timings or CheckTimings()
+        try:
+            # Let the server tell us nothing changed, where it supports validators
+            cached = self.fingerprints.get(('http', url))
+            request_headers = {}
+            if cached:
+                if cached['etag']:
+                    request_headers['If-None-Match'] = cached['etag']
+                if cached['last_modified']:
+                    request_headers['If-Modified-Since'] = cached['last_modified']
+                    
+            # Fingerprinted as it downloads, rather than from copies of the whole body afterwards
+            fingerprinter = HtmlFingerprint()
+            with timings.phase('fetch'):
+                http_status, headers, body, _, truncated = self.http_fetcher.fetch(url, request_headers,
+                                                                                   on_data=fingerprinter.update)
+            if http_status == 304 and cached:
+                timings.fingerprint = cached['evidence']
+                return cached['status']
+            if http_status >= 400:
+                return f'error: HTTP {http_status}'
+                
+            # Byte-identical product region: reuse the last classification
+            fingerprint = fingerprinter.hexdigest()
+            etag = headers.get('etag')
+            last_modified = headers.get('last-modified')
+            if cached and cached['fingerprint'] == fingerprint:
+                self.fingerprints.put(('http', url), fingerprint=fingerprint, etag=etag,
+                                      last_modified=last_modified, status=cached['status'],
+                                      evidence=cached['evidence'])
+                timings.fingerprint = cached['evidence']
+                return cached['status']
+                
+            charset = 'utf-8'
+            match = re.search(r'charset=([\w-]+)', headers.get('content-type', ''), re.I)
+            if match:
+                charset = match.group(1)
+            try:
+                decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+            except LookupError:
+                decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+                
+            rule = self.rules.rule_for(url)
+            with timings.phase('detection'):
+                # Decode and parse a slice at a time rather than holding a decoded copy of the page
+                parser = StockPageParser(rule)
+                for offset in range(0, len(body), HttpFetcher.READ_CHUNK):
+                    parser.feed(decoder.decode(body[offset:offset + HttpFetcher.READ_CHUNK]))
+                parser.feed(decoder.decode(b'', final=True))
+                parser.close()
+                
+            has_in_stock = bool(parser.in_stock)
+            has_out_of_stock = bool(parser.out_of_stock)
+            
+            with timings.phase('classification'):
+                # Same page source fallback as the browser path
+                if not has_in_stock and not has_out_of_stock:
+                    has_in_stock, has_out_of_stock = rule.fallback(body)
+                    
+                status = classify_stock(has_in_stock, has_out_of_stock)
+            if status != 'in_stock' and (parser.unverified or truncated):
+                # A button whose colour comes from CSS needs a real render, and the part of
+                # a page past max_page_bytes may still hold an in stock button
+                self.fingerprints.discard(('http', url))
+                return 'unknown'
+                
+            if status != 'unknown':
+                evidence = stock_fingerprint(sorted(set(parser.in_stock)), sorted(set(parser.out_of_stock)),
+                                             has_in_stock, has_out_of_stock)
+                self.fingerprints.put(('http', url), fingerprint=fingerprint, etag=etag,
+                                      last_modified=last_modified, status=status, evidence=evidence)
+                timings.fingerprint = evidence
+            return status
+        except Exception as e:
+            return f'error: {str(e)[:50]}'
+            
+    def check_stock_browser(self, url, timings=None):
+        """Check if product is in stock using Selenium"""
+        try:
+            from selenium.common.exceptions import TimeoutException, WebDriverException, JavascriptException
+        except ImportError:
+            # HTTP-only installs: report it like any other failed check, so it is recorded and backed off
+            return 'error: Selenium is not installed'
+        
+        timings = timings or CheckTimings()
+        pooled = None
+        broken = False
+        try:
+            # Borrow a warm browser session from the pool
+            with timings.phase('driver_acquire'):
+                pooled = self.driver_pool.acquire()
+            driver = pooled.driver
+            
+            # Load the page, without the images, media, fonts and trackers it doesn't need
+            with timings.phase('navigation'):
+                if pooled.lean:
+                    self.resource_blocker.apply(pooled, (urlsplit(url).hostname or '').lower())
+                driver.get(url)
+            
+            # Wait for the DOM to settle, then detect every button in a single round-trip
+            rule = self.rules.rule_for(url)
+            cached = self.fingerprints.get(('browser', url))
+            script_start = time.perf_counter()
+            verdict = driver.execute_async_script(DETECTION_SCRIPT,
+                                                  self.config.get('settle_quiet_ms', 500),
+                                                  self.config.get('settle_max_ms', 3000),
+                                                  cached['fingerprint'] if cached else None,
+                                                  rule.browser_spec)
+            # The script reports how long it waited for the DOM to settle; the rest is detection
+            script_seconds = time.perf_counter() - script_start
+            timings.add('wait', verdict['waited'] / 1000)
+            timings.add('detection', max(0, script_seconds - verdict['waited'] / 1000))
+            if verdict.get('unchanged'):
+                print(f"DEBUG: {url} unchanged since last check, reusing '{cached['status']}'")
+                timings.fingerprint = cached['evidence']
+                return cached['status']
+                
+            has_in_stock = verdict['in_stock'] is not None
+            has_out_of_stock = verdict['out_of_stock'] is not None
+            print(f"DEBUG: {url} settled in {verdict['waited']}ms, rule '{rule.name}', "
+                  f"in stock: {verdict['in_stock']}, out of stock: {verdict['out_of_stock']}")
+            
+            with timings.phase('classification'):
+                # Fallback to page source search - done in the page by the detection script
+                if not has_in_stock and not has_out_of_stock:
+                    fallback = verdict.get('fallback') or {}
+                    has_in_stock = bool(fallback.get('in_stock'))
+                    has_out_of_stock = bool(fallback.get('out_of_stock'))
+                    
+                # Determine stock status (in stock signals win)
+                status = classify_stock(has_in_stock, has_out_of_stock)
+            if status != 'unknown':
+                evidence = stock_fingerprint(verdict['in_stock'], verdict['out_of_stock'],
+                                             has_in_stock, has_out_of_stock)
+                self.fingerprints.put(('browser', url), fingerprint=verdict['fingerprint'], status=status,
+                                      evidence=evidence)
+                timings.fingerprint = evidence
+            return status
+                
+        except TimeoutException:
+            return 'error: Page load timeout'
+        except JavascriptException as e:
+            # The page broke the detection script - the browser itself is fine
+            return f'error: Detection script failed - {str(e)[:50]}'
+        except WebDriverException as e:
+            # The session may have crashed - don't hand it out again
+            broken = True
+            error_msg = str(e).lower()
+            if 'chrome' in error_msg or 'chromedriver' in error_msg:
+                return f'error: ChromeDriver issue - Check installation and version match Chrome browser'
+            return f'error: Browser error - {str(e)[:60]}'
+        except Exception as e:
+            return f'error: {str(e)[:50]}'
+        finally:
+            # Always hand the driver back so the next check can reuse it
+            if pooled:
+                self.driver_pool.release(pooled, broken=broken)
+                
+    def close(self):
+        """Quit the browsers and drop pooled connections"""
+        self.driver_pool.close()
+        self.http_fetcher.close()
+
+
+def process_memory_mb(pid):
+    """Resident memory of a process and everything it started (its browsers), in MB"""
+    try:
+        import psutil
+        process = psutil.Process(pid)
+        total = sum(p.memory_info().rss for p in [process] + process.children(recursive=True))
+        return total / (1024 * 1024)
+    except:
+        return None
+
+
+def kill_process_tree(process):
+    """Kill a worker process along with its chromedriver and Chrome children"""
+    try:
+        import psutil
+        for child in psutil.Process(process.pid).children(recursive=True):
+            child.kill()
+    except:
+        pass
+    try:
+        process.kill()
+        process.join(timeout=5)
+    except:
+        pass
+
+
+class WorkerJobTimings(CheckTimings):
+    """Timings for a check in a worker, which tell the pool once the check has its browser"""
+    def __init__(self, on_browser):
+        super().__init__()
+        self.on_browser = on_browser
+        
+    def add(self, name, seconds):
+        super().add(name, seconds)
+        if name == 'driver_acquire':
+            self.on_browser()
+
+
+def run_check_worker(config, jobs, results, checks_per_worker):
+    """Worker process: run (job_id, url) checks from jobs with this process's own browsers
+    
+    Reports ('started', job_id) when a check starts and again once it has a browser, so time
+    spent queued behind this worker's other checks doesn't count towards the hang timeout,
+    then ('done', job_id, status, fingerprint, path, phases).
+    """
+    # Ctrl+C reaches the whole process group; let the parent decide when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    checker = StockChecker(config)
+    executor = ThreadPoolExecutor(max_workers=checks_per_worker, thread_name_prefix='check')
+    
+    def run(job_id, url):
+        results.put(('started', job_id))
+        timings = WorkerJobTimings(lambda: results.put(('started', job_id)))
+        try:
+            status, fingerprint = checker.check(url, timings)
+        except Exception as e:
+            status, fingerprint = f'error: {str(e)[:50]}', None
+        results.put(('done', job_id, status, fingerprint, timings.path, dict(timings.phases)))
+        
+    parent = multiprocessing.parent_process()
+    try:
+        while True:
+            try:
+                job = jobs.get(timeout=5)
+            except queue.Empty:
+                # Don't outlive a parent that was killed outright
+                if parent is not None and not parent.is_alive():
+                    break
+                continue
+            if job is None:
+                break
+            executor.submit(run, *job)
+    finally:
+        executor.shutdown(wait=True)
+        checker.close()
+
+
+class WorkerSlot:
+    """One worker process and the jobs it has in flight"""
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.jobs = None
+        # job_id -> when the worker last reported it under way (None while still queued)
+        self.running = {}
+        self.retiring = False
+        self.replacing = False
+        self.memory_checked = 0
+
+
+class WorkerPool:
+    """Runs checks in worker processes that each own their browsers, replacing any that crash,
+    hang or grow too large"""
+    def __init__(self, config, count=2, checks_per_worker=4, browsers_per_worker=1,
+                 max_memory_mb=1500, job_timeout=180):
+        self.count = count
+        self.checks_per_worker = checks_per_worker
+        self.capacity = count * checks_per_worker
+        self.max_memory_mb = max_memory_mb
+        self.job_timeout = job_timeout
+        self.browsers_per_worker = browsers_per_worker
+        # Each worker's driver pool only has to feed that worker's checks
+        self.config = dict(config, driver_pool=dict(config.get('driver_pool', {}), size=browsers_per_worker))
+        
+        # 'spawn' everywhere: forking a process that already runs threads and browsers isn't safe
+        self.context = multiprocessing.get_context('spawn')
+        self.results = None
+        self.slots = [WorkerSlot(index) for index in range(count)]
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._backlog = []
+        self._affinity = {}
+        self._job_ids = itertools.count()
+        self._closed = False
+        self._thread = None
+        
+    def start(self):
+        """Start the worker processes and the thread that collects their results"""
+        if self._thread is not None:
+            return
+        self.results = self.context.Queue()
+        for slot in self.slots:
+            self._start_worker(slot)
+        self._thread = threading.Thread(target=self._supervise, daemon=True, name='workers')
+        self._thread.start()
+        
+    def _start_worker(self, slot):
+        """Spawn a fresh process for a slot - called without the lock, as spawning takes a while"""
+        config = self.config
+        jobs = self.context.Queue()
+        process = self.context.Process(target=run_check_worker, name=f'check-worker-{slot.index}',
+                                       args=(config, jobs, self.results, self.checks_per_worker), daemon=True)
+        process.start()
+        with self._lock:
+            slot.jobs = jobs
+            slot.process = process
+            slot.running = {}
+            slot.retiring = False
+            slot.replacing = False
+            slot.memory_checked = time.time()
+            if self.config is not config:
+                # Reconfigured while it was starting
+                slot.retiring = True
+                slot.jobs.put(None)
+            self._drain_backlog()
+        
+    def reconfigure(self, config):
+        """Switch to new settings; each worker is replaced once it finishes the checks it has"""
+        with self._lock:
+            self.config = dict(config, driver_pool=dict(config.get('driver_pool', {}), size=self.browsers_per_worker))
+            for slot in self.slots:
+                if slot.process is not None and not slot.retiring:
+                    slot.retiring = True
+                    slot.jobs.put(None)
+                    
+    def submit(self, url, timings):
+        """Queue a check; the future resolves to (status, fingerprint) and fills in timings"""
+        future = Future()
+        with self._lock:
+            job_id = next(self._job_ids)
+            self._jobs[job_id] = (future, timings, url, None)
+            self._dispatch(job_id)
+        return future
+        
+    def _dispatch(self, job_id):
+        """Hand a job to a worker with room, preferring the one that last saw its site - lock held"""
+        future, timings, url, _ = self._jobs[job_id]
+        host = (urlsplit(url).hostname or '').lower()
+        free = [slot for slot in self.slots
+                if not slot.retiring and len(slot.running) < self.checks_per_worker]
+        if not free:
+            self._backlog.append(job_id)
+            return
+        # The same worker keeps that site's fingerprints, connections and warm browser
+        preferred = self.slots[self._affinity.get(host, hash(host) % self.count)]
+        slot = preferred if preferred in free else min(free, key=lambda slot: len(slot.running))
+        self._affinity[host] = slot.index
+        slot.running[job_id] = None
+        self._jobs[job_id] = (future, timings, url, slot)
+        slot.jobs.put((job_id, url))
+        
+    def _supervise(self):
+        while not self._closed:
+            try:
+                self._collect(timeout=1)
+                self._check_workers()
+            except Exception as e:
+                print(f"Worker pool error: {e}")
+                
+    def _collect(self, timeout=None):
+        """Hand every result that has arrived back to its caller"""
+        try:
+            result = self.results.get(timeout=timeout) if timeout else self.results.get_nowait()
+            while True:
+                self._finish(result)
+                result = self.results.get_nowait()
+        except queue.Empty:
+            pass
+            
+
+    def _finish(self, result):
+        if result[0] == 'started':
+            with self._lock:
+                job = self._jobs.get(result[1])
+                if job is not None and result[1] in job[3].running:
+                    job[3].running[result[1]] = time.time()
+            return
+            
+        _, job_id, status, fingerprint, path, phases = result
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job is None:
+                # Already failed when its worker was replaced
+                return
+            future, timings, url, slot = job
+            slot.running.pop(job_id, None)
+            
+            if self.max_memory_mb and time.time() - slot.memory_checked > 10:
+                slot.memory_checked = time.time()
+                memory_mb = process_memory_mb(slot.process.pid)
+                if memory_mb is not None and memory_mb > self.max_memory_mb and not slot.retiring:
+                    print(f"DEBUG: Recycling worker {slot.index} using {memory_mb:.0f} MB")
+                    # Let it finish what it has, then replace it
+                    slot.retiring = True
+                    slot.jobs.put(None)
+            self._drain_backlog()
+            
+        timings.path = path
+        timings.phases.update(phases)
+        self._resolve(future, (status, fingerprint))
+        
+    def _resolve(self, future, result):
+        try:
+            future.set_result(result)
+        except InvalidStateError:
+            # The check was cancelled while the worker ran it
+            pass
+            
+    def _check_workers(self):
+        """Replace workers that died, hung on a check or finished retiring"""
+        now = time.time()
+        for slot in self.slots:
+            if self._closed:
+                return
+            if slot.replacing:
+                continue
+            if slot.process.is_alive():
+                with self._lock:
+                    started = [since for since in slot.running.values() if since is not None]
+                    if started and now - min(started) > self.job_timeout:
+                        print(f"DEBUG: Worker {slot.index} hung on a check, restarting it")
+                        self._fail(slot, 'error: Worker timed out')
+                        self._replace_worker(slot, kill=True)
+                continue
+                
+            # Results it managed to send before exiting may still be queued
+            self._collect()
+            with self._lock:
+                if slot.running or not slot.retiring:
+                    print(f"DEBUG: Worker {slot.index} exited with code {slot.process.exitcode}, restarting it")
+                self._fail(slot, 'error: Worker crashed')
+                self._replace_worker(slot)
+        with self._lock:
+            self._drain_backlog()
+            
+    def _replace_worker(self, slot, kill=False):
+        """Swap in a new process for a slot - lock held
+        
+        Killing (which waits for the process to go) and spawning happen on their own thread,
+        so submitting checks and collecting results from the other workers carry on meanwhile.
+        """
+        slot.retiring = True
+        slot.replacing = True
+        
+        def replace():
+            if kill:
+                kill_process_tree(slot.process)
+            if not self._closed:
+                self._start_worker(slot)
+                
+        threading.Thread(target=replace, daemon=True, name=f'replace-worker-{slot.index}').start()
+            
+    def _fail(self, slot, status):
+        for job_id in list(slot.running):
+            self._resolve(self._jobs.pop(job_id)[0], (status, None))
+        slot.running = {}
+        
+    def _drain_backlog(self):
+        backlog, self._backlog = self._backlog, []
+        for job_id in backlog:
+            if job_id in self._jobs:
+                self._dispatch(job_id)
+                
+    def close(self):
+        """Ask every worker to finish and exit, killing any that don't"""
+        self._closed = True
+        if self._thread is None:
+            return
+        self._thread.join(timeout=5)
+        for slot in self.slots:
+            try:
+                slot.jobs.put(None)
+            except:
+                pass
+        for slot in self.slots:
+            slot.process.join(timeout=10)
+            if slot.process.is_alive():
+                kill_process_tree(slot.process)
+        with self._lock:
+            for slot in self.slots:
+                self._fail(slot, 'error: Worker pool closed')
+
+
+class SharedCheck:
+    """One check in flight and the targets waiting on its result"""
+    def __init__(self, url, owner=None):
+        self.url = url
+        self.owner = owner
+        self.targets = []
+        self.started = False
+        self.task = None
+
+
+class MonitorEngine:
+    """Headless monitoring engine that schedules checks for any number of targets"""
+    # Settings a worker process compiles for itself when it starts
+    CHECK_SETTINGS = {'rules', 'lean_browser', 'driver_pool', 'http_first', 'js_only_domains', 'http_reprobe_after',
+                      'settle_quiet_ms', 'settle_max_ms', 'fingerprint_cache_size', 'max_page_bytes'}
+    # Settings only read at startup
+    RESTART_SETTINGS = {'driver_pool', 'workers', 'max_workers', 'metrics_port', 'control', 'check_log', 'history',
+                        'config_poll_interval', 'fingerprint_cache_size', 'ui_refresh_ms', 'ui_view',
+                        'ui_table_threshold'}
+    
+    def __init__(self, config_file="config.json"):
+        self.config_file = config_file
+        self.control_token_file = control_token_path(config_file)
         self.last_status = {}
         self.last_email_sent = {}
-        self.refresh_labels = []
+        self.listeners = []
+        # Replaced rather than changed in place (see _put_target), so any thread can iterate it
+        self.targets = {}
+        self._targets_lock = threading.RLock()
+        # The daemon starts enabled targets, including ones added to the config file later
+        self.autostart = False
         
         self.load_config()
-        self.create_ui()
+        self._config_stamp = self._stat_config()
+        self._watcher = None
+        self._stopping = threading.Event()
+        
+        self.metrics = Metrics(log_file=self.config.get('check_log', 'check_log.jsonl'))
+        self.metrics_server = None
+        
+        history_config = self.config.get('history', {})
+        self.history = None
+        if history_config.get('path', 'status_history.db'):
+            try:
+                self.history = StatusHistory(history_config.get('path', 'status_history.db'),
+                                             flush_interval=history_config.get('flush_interval', 5),
+                                             retention_days=history_config.get('retention_days', 90))
+            except sqlite3.Error as e:
+                print(f"History error: {e}")
+                
+        self.alerts = AlertDispatcher(self.config, self.last_email_sent,
+                                      coalesce_window=self.config.get('alert_coalesce_window', 5),
+                                      metrics=self.metrics, history=self.history)
+        
+        self.schedule = AdaptiveSchedule(self.config)
+        
+        # Checks run on threads in this process, or in worker processes that own their browsers
+        workers_config = self.config.get('workers', {})
+        self.checker = None
+        self.worker_pool = None
+        if workers_config.get('mode', 'thread') == 'process':
+            self.worker_pool = WorkerPool(self.config, count=workers_config.get('count') or default_process_count(),
+                                          checks_per_worker=workers_config.get('checks_per_worker', 4),
+                                          browsers_per_worker=workers_config.get('browsers_per_worker', 1),
+                                          max_memory_mb=workers_config.get('max_memory_mb', 1500),
+                                          job_timeout=workers_config.get('job_timeout', 180))
+            self.max_workers = self.worker_pool.capacity
+        else:
+            self.checker = StockChecker(self.config)
+            self.max_workers = self.config.get('max_workers') or default_worker_count()
+        self.per_domain_limit = self.config.get('per_domain_limit', 2)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='check')
         
+        # Min-heap of (next_due, seq, target_id); stale entries are skipped by seq
+        self._queue = []
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._worker_slots = asyncio.Semaphore(self.max_workers)
+        self._domain_semaphores = {}
+        # Checks in flight and recent results, by normalized URL, shared between targets
+        self._inflight = {}
+        self._recent_results = {}
+        self._tasks = set()
+        self._closed = False
+        self.loop = None
+        self._thread = None
+        
+        occurrences = Counter()
+        assigned = False
+        for index, tab in enumerate(self.config.get('tabs', [])):
+            url = tab.get('url', '')
+            target_id = tab.get('id')
+            if not target_id:
+                target_id = default_target_id(url, occurrences[normalize_url(url)])
+                occurrences[normalize_url(url)] += 1
+                assigned = True
+            target = MonitorTarget(target_id, url, tab.get('interval', 60),
+                                   tab.get('name') or f"Monitor {index + 1}", tab.get('enabled', True))
+            self.targets[target.id] = target
+        if assigned and os.path.exists(self.config_file):
+            # Write the ids into the file now, so later edits to it can't shift them
+            try:
+                self.save_config()
+            except OSError as e:
+                print(f"Could not save target ids: {e}")
+            
+        if self.history is not None:
+            # Pick up where the last run left off, so a restart doesn't re-alert everything
+            for target_id, (status, email_sent) in self.history.load_state().items():
+                if target_id in self.targets:
+                    if status is not None:
+                        self.last_status[target_id] = status
+                    if email_sent is not None:
+                        self.last_email_sent[target_id] = email_sent
+                        
     def load_config(self):
         """Load configuration from JSON file"""
         if os.path.exists(self.config_file):
@@ -45,16 +2566,673 @@ class StockMonitor:
                 'smtp_server': 'smtp.gmail.com',
                 'smtp_port': 587,
                 'email_interval': 300,
+                'driver_pool': {'max_uses': 50, 'max_memory_mb': 600},
+                'per_domain_limit': 2,
+                'http_first': True,
+                'js_only_domains': [],
+                'rules': [],
+                'adaptive': {'enabled': True, 'floor': 15, 'error_backoff_max': 1800,
+                             'stable_after': 5, 'relax_factor': 1.25, 'max_relax': 4},
+                'restock_windows': [],
+                'lean_browser': {'enabled': True, 'block': ['images', 'media', 'fonts', 'trackers'],
+                                 'allow_domains': {}},
+                'metrics_port': 9464,
+                'control': {'enabled': False},
+                'check_log': 'check_log.jsonl',
+                'history': {'path': 'status_history.db', 'retention_days': 90},
+                'workers': {'mode': 'thread'},
+                'dedupe_ttl': 10,
+                'config_poll_interval': 2,
                 'tabs': [
-                    {'url': '', 'interval': 60} for _ in range(5)
+                    {'name': 'Monitor 1', 'url': '', 'interval': 60}
                 ]
             }
             
     def save_config(self):
         """Save configuration to JSON file"""
+        self.config['tabs'] = [target.to_config() for target in self.targets.values()]
         with open(self.config_file, 'w') as f:
             json.dump(self.config, f, indent=4)
+        # Our own write isn't an edit to reload
+        self._config_stamp = self._stat_config()
+        
+    def _stat_config(self):
+        try:
+            stat = os.stat(self.config_file)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+            
+    def _watch_config(self):
+        """Poll the config file and apply edits to the running engine"""
+        interval = self.config.get('config_poll_interval', 2)
+        while not self._stopping.wait(interval):
+            stamp = self._stat_config()
+            if stamp is None or stamp == self._config_stamp:
+                continue
+            self._config_stamp = stamp
+            try:
+                self.reload_config()
+            except Exception as e:
+                print(f"Config reload error: {e}")
+                
+    def reload_config(self):
+        """Re-read the config file and reconcile settings and targets with it, in place"""
+        try:
+            with open(self.config_file, 'r') as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            # Most likely caught mid-write - the finished write will trigger another reload
+            print(f"Config reload error: {e}")
+            return
+        tabs = config.pop('tabs', [])
+        try:
+            self.update_settings(config, replace=True)
+        except ValueError as e:
+            # Targets don't depend on the settings, so they are still reconciled
+            print(f"Config reload error: {e} - keeping the previous settings")
+        self._reconcile_targets(tabs)
+        
+    def update_settings(self, settings, replace=False):
+        """Apply new settings (everything but tabs) to the running engine and return the keys that changed
+        
+        With replace, keys missing from settings are dropped; otherwise settings are merged in.
+        Nothing is changed if they don't compile - ValueError says why.
+        """
+        settings = {key: value for key, value in settings.items() if key != 'tabs'}
+        candidate = settings if replace else dict(self.config, **settings)
+        changed = {key for key in set(self.config) | set(candidate)
+                   if key != 'tabs' and self.config.get(key) != candidate.get(key)}
+        if not changed:
+            return changed
+            
+        # Compile first, so a bad value leaves everything as it was
+        compiled = {}
+        try:
+            if 'rules' in changed:
+                compiled['rules'] = RuleSet(candidate.get('rules', []))
+            if changed & {'adaptive', 'restock_windows'}:
+                compiled['schedule'] = AdaptiveSchedule(candidate)
+            if 'lean_browser' in changed:
+                ResourceBlocker(candidate)
+        except Exception as e:
+            raise ValueError(f"invalid settings ({', '.join(sorted(changed))}): {e}")
+            
+        # Update the dict in place - the checker, alert dispatcher and control API all hold it
+        for key in changed:
+            if key in candidate:
+                self.config[key] = candidate[key]
+            else:
+                del self.config[key]
+        self._apply_settings(changed, compiled)
+        return changed
+        
+    def _apply_settings(self, changed, compiled):
+        """Rebuild whatever was compiled from settings that just changed"""
+        if self.checker is not None:
+            self.checker.apply_settings(changed, rules=compiled.get('rules'))
+        if self.worker_pool is not None and changed & self.CHECK_SETTINGS:
+            # Workers compiled their own copy of these
+            self.worker_pool.reconfigure(self.config)
+        if 'schedule' in compiled:
+            self.schedule = compiled['schedule']
+        if 'per_domain_limit' in changed:
+            self.per_domain_limit = self.config.get('per_domain_limit', 2)
+            self._call_in_loop(self._domain_semaphores.clear)
+        if 'alert_coalesce_window' in changed:
+            # Read afresh for every digest
+            self.alerts.coalesce_window = self.config.get('alert_coalesce_window', 5)
+            
+        print(f"Settings updated: {', '.join(sorted(changed))} changed")
+        pending = changed & self.RESTART_SETTINGS - ({'driver_pool'} if self.worker_pool is not None else set())
+        if pending:
+            print(f"Config: {', '.join(sorted(pending))} take effect after a restart")
+            
+    def _reconcile_targets(self, tabs):
+        """Add, remove and update targets to match the config, leaving untouched ones running"""
+        # The GUI can add and remove targets at the same time
+        with self._targets_lock:
+            seen = set()
+            listed = {tab.get('id') for tab in tabs if tab.get('id')}
+            occurrences = Counter()
+            assigned = False
+            added = updated = removed = 0
+            for index, tab in enumerate(tabs):
+                target_id = tab.get('id')
+                if not target_id:
+                    # Hand-written entry: adopt the target already watching that URL, if any
+                    key = normalize_url(tab.get('url', ''))
+                    target_id = next((target.id for target in self.targets.values()
+                                      if target.url == tab.get('url', '') and target.id not in listed
+                                      and target.id not in seen), None)
+                    target_id = target_id or default_target_id(tab.get('url', ''), occurrences[key])
+                    occurrences[key] += 1
+                    assigned = True
+                seen.add(target_id)
+                url = tab.get('url', '')
+                interval = tab.get('interval', 60)
+                name = tab.get('name') or f"Monitor {index + 1}"
+                enabled = tab.get('enabled', True)
+            
+                target = self.targets.get(target_id)
+                if target is None:
+                    target = MonitorTarget(target_id, url, interval, name, enabled)
+                    self._put_target(target)
+                    self._notify('added', target)
+                    if enabled and url and self.autostart:
+                        self.start_target(target_id)
+                    added += 1
+                    continue
+                
+                if (url, interval, name) != (target.url, target.interval, target.name):
+                    self.update_target(target_id, url=url, interval=interval, name=name)
+                    updated += 1
+                if enabled != target.enabled:
+                    target.enabled = enabled
+                    if not enabled:
+                        self.stop_target(target_id)
+                    elif url and self.autostart:
+                        self.start_target(target_id)
+                    updated += 1
+                
+            for target_id in set(self.targets) - seen:
+                self.remove_target(target_id)
+                removed += 1
+            
+            if added or updated or removed:
+                print(f"Config reloaded: {added} target(s) added, {updated} updated, {removed} removed")
+            if assigned:
+                # Write the new ids back so later edits match up
+                self.save_config()
+            
+    def target_state(self, target):
+        """A JSON-friendly snapshot of a target, for the control endpoint"""
+        return {'id': target.id, 'name': target.name, 'url': target.url, 'interval': target.interval,
+                'enabled': target.enabled, 'running': target.running, 'checking': target.checking,
+                'status': self.last_status.get(target.id), 'last_checked': target.last_checked,
+                'next_due': target.next_due}
+                
+    def add_listener(self, callback):
+        """Register callback(event, target, value) for 'checking', 'status', 'stopped',
+        'added', 'removed' and 'updated' events"""
+        self.listeners.append(callback)
+        
+    def _notify(self, event, target, value=None):
+        for callback in list(self.listeners):
+            try:
+                callback(event, target, value)
+            except Exception as e:
+                print(f"Listener error: {e}")
+                
+    def _call_in_loop(self, callback, *args):
+        """Run callback on the engine's event loop thread (or right here before it starts)"""
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(callback, *args)
+        else:
+            callback(*args)
+            
+    def add_target(self, url='', interval=60, name=None):
+        """Add a new (stopped) target"""
+        target = MonitorTarget(uuid.uuid4().hex[:8], url, interval,
+                               name or f"Monitor {len(self.targets) + 1}")
+        self._put_target(target)
+        self._notify('added', target)
+        return target
+        
+    def remove_target(self, target_id):
+        """Stop and forget a target"""
+        self.stop_target(target_id)
+        target = self._pop_target(target_id)
+        self.last_status.pop(target_id, None)
+        self.last_email_sent.pop(target_id, None)
+        self.metrics.forget_target(target_id)
+        if target is not None:
+            self._notify('removed', target)
+            
+    def _put_target(self, target):
+        # Copy on write: the GUI, control server and config watcher threads iterate targets unlocked
+        with self._targets_lock:
+            self.targets = {**self.targets, target.id: target}
+            
+    def _pop_target(self, target_id):
+        with self._targets_lock:
+            targets = dict(self.targets)
+            target = targets.pop(target_id, None)
+            self.targets = targets
+        return target
+        
+    def update_target(self, target_id, url=None, interval=None, name=None):
+        """Change a target's settings; a new interval reschedules it immediately"""
+        target = self.targets[target_id]
+        before = (target.url, target.interval, target.name)
+        if url is not None:
+            target.url = url
+        if name is not None:
+            target.name = name
+        if interval is not None and interval != target.interval:
+            target.interval = interval
+            self._call_in_loop(self._reschedule, target)
+        if (target.url, target.interval, target.name) != before:
+            self._notify('updated', target)
+            
+    def start_target(self, target_id):
+        """Start checking a target right away"""
+        target = self.targets[target_id]
+        if not target.running:
+            target.running = True
+            self._call_in_loop(self._start_target, target)
+            
+    def stop_target(self, target_id):
+        """Stop checking a target; an in-flight check is cancelled"""
+        target = self.targets.get(target_id)
+        if target is None:
+            return
+        target.running = False
+        self._call_in_loop(self._stop_target, target)
+        self._notify('stopped', target)
+        
+    def _start_target(self, target):
+        if target.running and target.task is None and target.schedule_seq is None:
+            self._schedule(target, time.time())
+            
+    def _stop_target(self, target):
+        target.schedule_seq = None
+        if target.task is not None:
+            target.task.cancel()
+            target.task = None
+            
+    def _reschedule(self, target):
+        # A new configured interval starts the adaptive schedule afresh
+        target.current_interval = None
+        target.error_count = 0
+        target.stable_count = 0
+        if target.running and target.schedule_seq is not None:
+            self._schedule(target, (target.last_checked or time.time()) + target.interval)
+            
+    def start(self):
+        """Start the event loop thread that drives all checks"""
+        if self.loop is not None:
+            return
+        if self.config.get('metrics_port'):
+            control = self.config.get('control', {})
+            try:
+                # The control API is opt-in; /metrics alone can't change anything
+                token = load_control_token(control.get('token_file') or self.control_token_file) \
+                    if control.get('enabled', False) else None
+                self.metrics_server = start_control_server(self, self.config['metrics_port'], token=token)
+            except OSError as e:
+                print(f"Metrics server error: {e}")
+                
+        if self.worker_pool is not None:
+            self.worker_pool.start()
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, args=(ready,), daemon=True)
+        self._thread.start()
+        ready.wait()
+        
+        if self.config.get('config_poll_interval', 2):
+            self._watcher = threading.Thread(target=self._watch_config, daemon=True, name='config')
+            self._watcher.start()
+        
+    def _run_loop(self, ready):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(ready.set)
+        self._spawn(self.alerts.run())
+        try:
+            self.loop.run_until_complete(self._scheduler())
+        finally:
+            self.loop.close()
+            
+    def shutdown(self):
+        """Stop all checks and release browsers and connections"""
+        self._stopping.set()
+        for target in self.targets.values():
+            target.running = False
+        self._call_in_loop(self._shutdown)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.alerts.close()
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+        if self.checker is not None:
+            self.checker.close()
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+        if self.history is not None:
+            self.history.close()
+        
+    def _shutdown(self):
+        self._closed = True
+        for task in list(self._tasks):
+            task.cancel()
+        self._wake.set()
+        
+    def _host(self, url):
+        return (urlsplit(url).hostname or '').lower()
+        
+    def _spawn(self, coro):
+        """Start a task on the loop and keep a handle so shutdown can cancel it"""
+        task = self.loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+        
+    def _schedule(self, target, due):
+        """Queue a target's next check - loop thread only"""
+        seq = next(self._seq)
+        target.next_due = due
+        target.schedule_seq = seq
+        heapq.heappush(self._queue, (due, seq, target.id))
+        self._wake.set()
+        
+    async def _scheduler(self):
+        """Start a check task for each due target, earliest first"""
+        while not self._closed:
+            delay = None
+            while self._queue:
+                due, seq, target_id = self._queue[0]
+                target = self.targets.get(target_id)
+                if target is None or not target.running or target.schedule_seq != seq:
+                    # Stale entry left behind by a stop or reschedule
+                    heapq.heappop(self._queue)
+                    continue
+                delay = due - time.time()
+                if delay > 0:
+                    break
+                heapq.heappop(self._queue)
+                target.schedule_seq = None
+                target.task = self._spawn(self._run_check(target, target.url))
+                delay = None
+                
+            # Sleep until the next target is due or the schedule changes
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+                
+    def _domain_slots(self, host):
+        if host not in self._domain_semaphores:
+            self._domain_semaphores[host] = asyncio.Semaphore(self.per_domain_limit)
+        return self._domain_semaphores[host]
+        
+    async def _run_check(self, target, url):
+        """Run one check without blocking the loop and schedule the next one"""
+        due = None
+        try:
+            started = time.perf_counter()
+            status, fingerprint, timings = await self._shared_check(target, url)
+            self.metrics.record_check(target, url, status, time.perf_counter() - started, timings)
+            target.last_checked = time.time()
+            
+            previous = self.last_status.get(target.id)
+            self.last_status[target.id] = status
+            if self.history is not None:
+                self.history.record(target.id, url, status, target.last_checked)
+            
+            changed = previous is not None and (
+                status != previous or (fingerprint is not None and target.fingerprint is not None
+                                       and fingerprint != target.fingerprint))
+            target.fingerprint = fingerprint
+            due = self.schedule.next_due(target, status, changed, target.last_checked)
+            
+            # Send email if status changed
+            if status == 'in_stock' and previous != 'in_stock':
+                self.alerts.enqueue(target.id, target.name, url)
+                
+            self._notify('status', target, status)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Check error for {url}: {e}")
+        finally:
+            if target.task is asyncio.current_task():
+                target.task = None
+                if target.running and target.schedule_seq is None and not self._closed:
+                    self._schedule(target, due or time.time() + target.interval)
+                    
+    async def _shared_check(self, target, url):
+        """Check a URL, sharing a check already in flight or a fresh result with other targets on it"""
+        key = normalize_url(url)
+        recent = self._recent_results.get(key)
+        if (recent is not None and time.time() - recent[0] < self.config.get('dedupe_ttl', 10)
+                and target.id not in recent[3]):
+            # A target never gets the same result twice, so its own interval still means a fresh check
+            recent[3].add(target.id)
+            timings = CheckTimings()
+            timings.path = 'shared'
+            return recent[1], recent[2], timings
+            
+        shared = self._inflight.get(key)
+        if shared is None:
+            shared = SharedCheck(url, owner=target)
+            shared.task = self._spawn(self._perform_check(key, shared))
+            self._inflight[key] = shared
+        shared.targets.append(target)
+        if shared.started:
+            target.checking = True
+            self._notify('checking', target)
+        try:
+            # Shielded: one subscriber being stopped mustn't cancel the check for the others
+            status, fingerprint, timings = await asyncio.shield(shared.task)
+        finally:
+            target.checking = False
+            shared.targets.remove(target)
+            if not shared.targets and not shared.task.done():
+                # Nobody is waiting any more - stop() still cancels the check
+                shared.task.cancel()
+        if target is not shared.owner:
+            timings = CheckTimings()
+            timings.path = 'shared'
+        return status, fingerprint, timings
+        
+    async def _perform_check(self, key, shared):
+        """Run the one real check behind a SharedCheck"""
+        url = shared.url
+        try:
+            # Waiting for a slot costs no thread, and stop() can cancel it right away
+            async with self._domain_slots(self._host(url)):
+                async with self._worker_slots:
+                    shared.started = True
+                    for target in list(shared.targets):
+                        target.checking = True
+                        self._notify('checking', target)
+                    timings = CheckTimings()
+                    if self.worker_pool is not None:
+                        status, fingerprint = await asyncio.wrap_future(self.worker_pool.submit(url, timings))
+                    else:
+                        status, fingerprint = await self.loop.run_in_executor(self._executor, self.checker.check,
+                                                                              url, timings)
+                                                                              
+            now = time.time()
+            if len(self._recent_results) > 1000:
+                ttl = self.config.get('dedupe_ttl', 10)
+                for stale in [k for k, result in self._recent_results.items() if now - result[0] >= ttl]:
+                    del self._recent_results[stale]
+            self._recent_results[key] = (now, status, fingerprint, {target.id for target in shared.targets})
+            return status, fingerprint, timings
+        finally:
+            if self._inflight.get(key) is shared:
+                del self._inflight[key]
+
+
+class RemoteEngine:
+    """Stands in for a MonitorEngine running in another process, through its control endpoint"""
+    # The settings the window edits - everything else belongs to the daemon, which may have
+    # reloaded newer values since we attached
+    GUI_SETTINGS = ('email_from', 'email_password', 'email_to', 'email_interval')
+    
+    def __init__(self, base_url, token, poll_interval=1.0):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.poll_interval = poll_interval
+        self.listeners = []
+        # Copy on write, as in MonitorEngine - the poll thread changes it while the GUI reads it
+        self.targets = {}
+        self._targets_lock = threading.RLock()
+        self.last_status = {}
+        self._stop = threading.Event()
+        self._thread = None
+        
+        self.config = self._request('GET', '/config')
+        self._refresh(notify=False)
+        
+    def _request(self, method, path, data=None):
+        body = json.dumps(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method,
+                                         headers={'Content-Type': 'application/json',
+                                                  'Authorization': f'Bearer {self.token}'})
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.loads(response.read() or b'null')
+            
+    def _apply_state(self, state):
+        with self._targets_lock:
+            target = self.targets.get(state['id'])
+            if target is None:
+                target = MonitorTarget(state['id'])
+                self.targets = {**self.targets, target.id: target}
+        target.url = state['url']
+        target.interval = state['interval']
+        target.name = state['name']
+        target.running = state['running']
+        return target
+        
+    def _refresh(self, notify=True):
+        """Mirror the daemon's targets and turn changes into listener events"""
+        states = self._request('GET', '/targets')
+        seen = set()
+        for state in states:
+            known = self.targets.get(state['id'])
+            before = (known.url, known.interval, known.name) if known else None
+            target = self._apply_state(state)
+            seen.add(target.id)
+            was_checking, last_checked = target.checking, target.last_checked
+            target.checking = state['checking']
+            target.last_checked = state['last_checked']
+            if state['status'] is not None:
+                self.last_status[target.id] = state['status']
+            if not notify:
+                continue
+            if known is None:
+                self._notify('added', target)
+            elif before != (target.url, target.interval, target.name):
+                self._notify('updated', target)
+            if target.checking and not was_checking:
+                self._notify('checking', target)
+            if target.last_checked != last_checked and state['status'] is not None:
+                self._notify('status', target, state['status'])
+        for target_id in set(self.targets) - seen:
+            target = self._pop_target(target_id)
+            if notify and target is not None:
+                self._notify('removed', target)
+                
+    def _pop_target(self, target_id):
+        with self._targets_lock:
+            targets = dict(self.targets)
+            target = targets.pop(target_id, None)
+            self.targets = targets
+        return target
+                
+    def _poll(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self._refresh()
+            except Exception as e:
+                print(f"Lost contact with engine at {self.base_url}: {e}")
+                
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+        
+    def _notify(self, event, target, value=None):
+        for callback in list(self.listeners):
+            try:
+                callback(event, target, value)
+            except Exception as e:
+                print(f"Listener error: {e}")
+                
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._poll, daemon=True)
+            self._thread.start()
             
+    def shutdown(self):
+        """Detach - the daemon keeps running"""
+        self._stop.set()
+        
+    def add_target(self, url='', interval=60, name=None):
+        return self._apply_state(self._request('POST', '/targets', {'url': url, 'interval': interval, 'name': name}))
+        
+    def remove_target(self, target_id):
+        self._request('DELETE', f'/targets/{target_id}')
+        self._pop_target(target_id)
+        
+    def update_target(self, target_id, url=None, interval=None, name=None):
+        self._apply_state(self._request('POST', f'/targets/{target_id}',
+                                        {'url': url, 'interval': interval, 'name': name}))
+        
+    def start_target(self, target_id):
+        self._apply_state(self._request('POST', f'/targets/{target_id}', {'running': True}))
+        
+    def stop_target(self, target_id):
+        self._apply_state(self._request('POST', f'/targets/{target_id}', {'running': False}))
+        self._notify('stopped', self.targets[target_id])
+        
+    def save_config(self):
+        self._request('POST', '/config', {key: self.config[key] for key in self.GUI_SETTINGS if key in self.config})
+
+
+class UiUpdateBus:
+    """Collects engine events from any thread; the UI drains the latest state per target on its own tick"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        
+    def publish(self, event, target, value=None):
+        """Engine listener - a burst of events for one target collapses into a single update"""
+        with self._lock:
+            update = self._pending.setdefault(target.id, {})
+            if event in ('added', 'removed'):
+                update['membership'] = event
+            elif event == 'updated':
+                update['updated'] = True
+            elif event == 'checking':
+                update['checking'] = True
+            elif event == 'status':
+                update['checking'] = False
+                update['status'] = value
+            elif event == 'stopped':
+                update['checking'] = False
+                
+    def drain(self):
+        """{target_id: changes} since the last drain"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+
+class StockMonitor:
+    def __init__(self, root, engine):
+        self.root = root
+        self.root.title("Stock Monitor")
+        self.root.geometry("900x700")
+        
+        self.engine = engine
+        self.config = self.engine.config
+        
+        # Engine events are batched and applied once per tick, and only changed widgets are touched
+        self.bus = UiUpdateBus()
+        self.tick_ms = self.config.get('ui_refresh_ms', 250)
+        self.states = {}
+        self.rendered = {}
+        
+        self.create_ui()
+        self.engine.add_listener(self.bus.publish)
+        self.engine.start()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(self.tick_ms, self.flush_updates)
+        
     def create_ui(self):
         """Create the user interface"""
         # Email Settings Frame
@@ -81,27 +3259,119 @@ class StockMonitor:
         self.email_interval_entry.grid(row=1, column=3, padx=5)
         self.email_interval_entry.insert(0, str(self.config.get('email_interval', 300)))
         
+        ttk.Button(email_frame, text="Add Monitor", command=self.add_monitor).grid(row=2, column=2, pady=5)
         ttk.Button(email_frame, text="Save Settings", command=self.save_settings).grid(row=2, column=3, pady=5)
         
-        # Notebook for tabs
-        self.notebook = ttk.Notebook(self.root)
-        self.notebook.pack(fill="both", expand=True, padx=10, pady=5)
+        # Widgets are keyed by target id so monitors can come and go
+        self.tab_frames = {}
+        self.refresh_labels = {}
+        self.url_entries = {}
+        self.interval_entries = {}
+        self.status_labels = {}
+        self.start_buttons = {}
+        self.stop_buttons = {}
+        
+        # A tab per monitor, or one table row each once there are too many for tabs
+        self.table = None
+        view = self.config.get('ui_view', 'auto')
+        if view == 'table' or (view == 'auto' and len(self.engine.targets) > self.config.get('ui_table_threshold', 15)):
+            self.create_table()
+        else:
+            self.notebook = ttk.Notebook(self.root)
+            self.notebook.pack(fill="both", expand=True, padx=10, pady=5)
+            
+        for target in list(self.engine.targets.values()):
+            self.create_monitor(target)
+            
+    def create_monitor(self, target):
+        """Add the widgets for one monitor, showing its current state"""
+        if target.running:
+            # Attaching to a running engine: reflect targets it is already checking
+            self.states[target.id] = {'checking': target.checking, 'status': self.engine.last_status.get(target.id)}
+        if self.table is not None:
+            self.table.insert('', 'end', iid=target.id)
+            self.render(target)
+            return None
+        frame = self.create_monitor_tab(target)
+        self.render(target)
+        return frame
+        
+    def create_table(self):
+        """One row per monitor, with a shared editor for the selected ones"""
+        frame = ttk.Frame(self.root)
+        frame.pack(fill="both", expand=True, padx=10, pady=5)
+        
+        columns = (('name', "Name", 160), ('status', "Status", 190), ('interval', "Interval", 70), ('url', "URL", 400))
+        self.table = ttk.Treeview(frame, columns=[column for column, _, _ in columns], show="headings")
+        for column, heading, width in columns:
+            self.table.heading(column, text=heading)
+            self.table.column(column, width=width, stretch=column == 'url')
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=self.table.yview)
+        self.table.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side="right", fill="y")
+        self.table.pack(fill="both", expand=True)
+        
+        self.table.tag_configure('in_stock', background="#c6efce")
+        self.table.tag_configure('out_of_stock', background="#ffc7ce")
+        self.table.tag_configure('error', background="#ffe0b2")
+        self.table.bind('<<TreeviewSelect>>', self.on_table_select)
+        
+        editor = ttk.LabelFrame(self.root, text="Selected Monitors", padding=10)
+        editor.pack(fill="x", padx=10, pady=5)
+        
+        ttk.Label(editor, text="Product URL:").grid(row=0, column=0, sticky="w", padx=5)
+        self.table_url_entry = ttk.Entry(editor, width=80)
+        self.table_url_entry.grid(row=0, column=1, columnspan=4, sticky="we", padx=5)
         
-        self.tab_frames = []
-        self.url_entries = []
-        self.interval_entries = []
-        self.status_labels = []
-        self.start_buttons = []
-        self.stop_buttons = []
+        ttk.Label(editor, text="Check Interval (seconds):").grid(row=1, column=0, sticky="w", padx=5, pady=5)
+        self.table_interval_entry = ttk.Entry(editor, width=10)
+        self.table_interval_entry.grid(row=1, column=1, sticky="w", padx=5, pady=5)
         
-        for i in range(5):
-            self.create_monitor_tab(i)
+        ttk.Button(editor, text="Start Monitoring", command=self.start_selected).grid(row=1, column=2, padx=5)
+        ttk.Button(editor, text="Stop Monitoring", command=self.stop_selected).grid(row=1, column=3, padx=5)
+        ttk.Button(editor, text="Remove Monitor", command=self.remove_selected).grid(row=1, column=4, padx=5)
+        
+    def on_table_select(self, event=None):
+        """Load a single selected monitor into the editor"""
+        selection = self.table.selection()
+        self.table_url_entry.delete(0, "end")
+        self.table_interval_entry.delete(0, "end")
+        if len(selection) == 1:
+            target = self.engine.targets[selection[0]]
+            self.table_url_entry.insert(0, target.url)
+            self.table_interval_entry.insert(0, str(target.interval))
+            
+    def start_selected(self):
+        """Start every selected monitor"""
+        selection = self.table.selection()
+        if not selection:
+            return
+        if not self.config.get('email_from') or not self.config.get('email_password'):
+            messagebox.showwarning("Warning", "Email settings not configured. Monitoring will work but no alerts will be sent.")
+        for target_id in selection:
+            self.start_monitoring(target_id, warn=False)
+            
+    def stop_selected(self):
+        """Stop every selected monitor"""
+        for target_id in self.table.selection():
+            self.stop_monitoring(target_id)
             
-    def create_monitor_tab(self, index):
+    def remove_selected(self):
+        """Remove every selected monitor"""
+        selection = self.table.selection()
+        if len(selection) == 1:
+            self.remove_monitor(selection[0])
+        elif selection and messagebox.askyesno("Remove Monitors", f"Remove {len(selection)} monitors?"):
+            for target_id in selection:
+                self.forget_monitor(target_id)
+                
+
+    def create_monitor_tab(self, target):
         """Create a monitor tab"""
+        target_id = target.id
         frame = ttk.Frame(self.notebook)
-        self.notebook.add(frame, text=f"Monitor {index + 1}")
-        self.tab_frames.append(frame)
+        self.notebook.add(frame, text=target.name)
+        self.tab_frames[target_id] = frame
         
         # Refresh Indicator Label
         refresh_label = tk.Label(frame, text="", font=("Arial", 9, "italic"), 
@@ -110,16 +3380,14 @@ class StockMonitor:
         refresh_label.pack_forget()  # Hide initially
         
         # Store refresh label for later access
-        if not hasattr(self, 'refresh_labels'):
-            self.refresh_labels = []
-        self.refresh_labels.append(refresh_label)
+        self.refresh_labels[target_id] = refresh_label
         
         # URL Input
         ttk.Label(frame, text="Product URL:").pack(anchor="w", padx=10, pady=(10, 0))
         url_entry = ttk.Entry(frame, width=80)
         url_entry.pack(fill="x", padx=10, pady=5)
-        url_entry.insert(0, self.config['tabs'][index]['url'])
-        self.url_entries.append(url_entry)
+        url_entry.insert(0, target.url)
+        self.url_entries[target_id] = url_entry
         
         # Interval Input
         interval_frame = ttk.Frame(frame)
@@ -128,22 +3396,25 @@ class StockMonitor:
         ttk.Label(interval_frame, text="Check Interval (seconds):").pack(side="left")
         interval_entry = ttk.Entry(interval_frame, width=10)
         interval_entry.pack(side="left", padx=5)
-        interval_entry.insert(0, str(self.config['tabs'][index]['interval']))
-        self.interval_entries.append(interval_entry)
+        interval_entry.insert(0, str(target.interval))
+        self.interval_entries[target_id] = interval_entry
         
         # Control Buttons
         button_frame = ttk.Frame(frame)
         button_frame.pack(fill="x", padx=10, pady=10)
         
         start_btn = ttk.Button(button_frame, text="Start Monitoring", 
-                               command=lambda i=index: self.start_monitoring(i))
+                               command=lambda i=target_id: self.start_monitoring(i))
         start_btn.pack(side="left", padx=5)
-        self.start_buttons.append(start_btn)
+        self.start_buttons[target_id] = start_btn
         
         stop_btn = ttk.Button(button_frame, text="Stop Monitoring", 
-                              command=lambda i=index: self.stop_monitoring(i), state="disabled")
+                              command=lambda i=target_id: self.stop_monitoring(i), state="disabled")
         stop_btn.pack(side="left", padx=5)
-        self.stop_buttons.append(stop_btn)
+        self.stop_buttons[target_id] = stop_btn
+        
+        ttk.Button(button_frame, text="Remove Monitor",
+                   command=lambda i=target_id: self.remove_monitor(i)).pack(side="right", padx=5)
         
         # Status Display
         status_frame = ttk.LabelFrame(frame, text="Status", padding=10)
@@ -152,7 +3423,59 @@ class StockMonitor:
         status_label = tk.Label(status_frame, text="Not monitoring", 
                                font=("Arial", 12), bg="gray", fg="white", pady=20)
         status_label.pack(fill="both", expand=True)
-        self.status_labels.append(status_label)
+        self.status_labels[target_id] = status_label
+        return frame
+        
+    def add_monitor(self):
+        """Add a new, empty monitor tab (or table row)"""
+        target = self.engine.add_target()
+        frame = self.create_monitor(target)
+        if self.table is not None:
+            self.table.selection_set(target.id)
+            self.table.see(target.id)
+        else:
+            self.notebook.select(frame)
+            
+    def remove_monitor(self, target_id):
+        """Stop a monitor and remove its tab"""
+        if not messagebox.askyesno("Remove Monitor", f"Remove {self.engine.targets[target_id].name}?"):
+            return
+        self.forget_monitor(target_id)
+        
+    def forget_monitor(self, target_id):
+        """Remove a monitor from the engine and the window"""
+        self.engine.remove_target(target_id)
+        self.drop_monitor(target_id)
+        
+    def drop_monitor(self, target_id):
+        """Remove a monitor's widgets"""
+        self.states.pop(target_id, None)
+        self.rendered.pop(target_id, None)
+        if self.table is not None:
+            self.table.delete(target_id)
+            return
+        self.notebook.forget(self.tab_frames[target_id])
+        self.tab_frames.pop(target_id).destroy()
+        for widgets in (self.refresh_labels, self.url_entries, self.interval_entries,
+                        self.status_labels, self.start_buttons, self.stop_buttons):
+            widgets.pop(target_id, None)
+            
+    def refresh_entries(self, target):
+        """Show a URL or interval that changed outside the window"""
+        for entries, value in ((self.url_entries, target.url), (self.interval_entries, str(target.interval))):
+            entry = entries.get(target.id)
+            if entry is not None and entry.get() != value:
+                entry.delete(0, "end")
+                entry.insert(0, value)
+                
+    def entered_settings(self, target_id):
+        """The URL and interval typed in for a monitor"""
+        if target_id in self.url_entries:
+            return self.url_entries[target_id].get(), self.interval_entries[target_id].get()
+        if self.table is not None and self.table.selection() == (target_id,):
+            return self.table_url_entry.get(), self.table_interval_entry.get()
+        target = self.engine.targets[target_id]
+        return target.url, str(target.interval)
         
     def save_settings(self):
         """Save all settings to config"""
@@ -162,187 +3485,22 @@ class StockMonitor:
             self.config['email_to'] = self.email_to_entry.get()
             self.config['email_interval'] = int(self.email_interval_entry.get())
             
-            for i in range(5):
-                self.config['tabs'][i]['url'] = self.url_entries[i].get()
-                self.config['tabs'][i]['interval'] = int(self.interval_entries[i].get())
+            for target_id in list(self.engine.targets):
+                url, interval = self.entered_settings(target_id)
+                self.engine.update_target(target_id, url=url, interval=int(interval))
+                self.render(self.engine.targets[target_id])
                 
-            self.save_config()
+            self.engine.save_config()
             messagebox.showinfo("Success", "Settings saved successfully!")
         except ValueError:
             messagebox.showerror("Error", "Invalid interval value. Please enter numbers only.")
             
-    def check_stock(self, url):
-        """Check if product is in stock using Selenium"""
-        driver = None
-        try:
-            # Setup Chrome options
-            chrome_options = Options()
-            chrome_options.add_argument('--headless')
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('--disable-gpu')
-            chrome_options.add_argument('--window-size=1920,1080')
-            chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-            chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-            chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-            chrome_options.add_experimental_option('useAutomationExtension', False)
-            
-            # Get the directory where this script is located
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            chromedriver_path = os.path.join(script_dir, 'chromedriver.exe')
-            
-            # Check if chromedriver exists in script directory
-            if os.path.exists(chromedriver_path):
-                print(f"Using ChromeDriver at: {chromedriver_path}")
-                service = Service(chromedriver_path)
-                driver = webdriver.Chrome(service=service, options=chrome_options)
-            else:
-                # Try without explicit path (will search in PATH/system32)
-                print("ChromeDriver not found in script directory, trying system PATH...")
-                driver = webdriver.Chrome(options=chrome_options)
-            
-            driver.set_page_load_timeout(30)
-            
-            # Load the page
-            driver.get(url)
-            
-            # Wait for page to load (wait for body element)
-            WebDriverWait(driver, 15).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            
-            # Give extra time for dynamic content to load
-            time.sleep(3)
-            
-            # Get page source after JavaScript execution
-            page_source = driver.page_source.lower()
-            
-            # Also try to find buttons/elements
-            has_add_to_cart = False
-            has_add_to_bag = False
-            has_add_to_basket_enabled = False
-            has_add_to_wishlist = False
-            
-            try:
-                # Search for elements containing "add to cart"
-                elements = driver.find_elements(By.XPATH, "//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'add to cart')]")
-                if elements:
-                    has_add_to_cart = True
-            except:
-                pass
-            
-            try:
-                # Search for elements containing "add to bag"
-                elements = driver.find_elements(By.XPATH, "//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'add to bag')]")
-                if elements:
-                    has_add_to_bag = True
-            except:
-                pass
-            
-            try:
-                # Search for "add to basket" button and check if it has BLACK background
-                basket_elements = driver.find_elements(By.XPATH, "//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'add to basket')]")
-                print(f"DEBUG: Found {len(basket_elements)} 'add to basket' elements")
-                
-                if basket_elements:
-                    # Check if the button is enabled (clickable) AND has black background
-                    for idx, element in enumerate(basket_elements):
-                        print(f"DEBUG: Checking element {idx + 1}")
-                        print(f"  - is_enabled: {element.is_enabled()}")
-                        print(f"  - is_displayed: {element.is_displayed()}")
-                        
-                        if element.is_enabled() and element.is_displayed():
-                            # Additional check: verify it's not disabled via attribute
-                            disabled_attr = element.get_attribute('disabled')
-                            aria_disabled = element.get_attribute('aria-disabled')
-                            
-                            print(f"  - disabled attribute: {disabled_attr}")
-                            print(f"  - aria-disabled: {aria_disabled}")
-                            
-                            if disabled_attr is None and aria_disabled != 'true':
-                                # Check background color - must be black for in stock
-                                try:
-                                    bg_color = element.value_of_css_property('background-color')
-                                    print(f"  - Background color: {bg_color}")
-                                    
-                                    # Convert to lowercase for comparison
-                                    bg_color_lower = bg_color.lower()
-                                    
-                                    # Check if background is black or very dark
-                                    # Black can be: rgb(0, 0, 0), rgba(0, 0, 0, 1), or very dark greys
-                                    is_black = False
-                                    
-                                    if 'rgb' in bg_color_lower:
-                                        # Extract RGB values
-                                        rgb_values = re.findall(r'\d+', bg_color_lower)
-                                        if len(rgb_values) >= 3:
-                                            r, g, b = int(rgb_values[0]), int(rgb_values[1]), int(rgb_values[2])
-                                            print(f"  - RGB values: R={r}, G={g}, B={b}")
-                                            # Consider it black if all RGB values are below 50 (dark enough)
-                                            if r < 50 and g < 50 and b < 50:
-                                                is_black = True
-                                                print(f"  - Is black: YES - Marking as IN STOCK")
-                                            else:
-                                                print(f"  - Is black: NO - Button is not black (likely grey/disabled)")
-                                    
-                                    if is_black:
-                                        has_add_to_basket_enabled = True
-                                        break
-                                    else:
-                                        print(f"  - Skipping this button - background is not black")
-                                except Exception as color_error:
-                                    print(f"  - Error getting color: {color_error}")
-                                    # If we can't get color, DO NOT fall back - be strict
-                                    print(f"  - Cannot verify color, skipping this element")
-            except Exception as e:
-                print(f"DEBUG: Error in basket check: {e}")
-                pass
-            
-            try:
-                # Search for elements containing "add to wishlist"
-                elements = driver.find_elements(By.XPATH, "//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'add to wishlist')]")
-                if elements:
-                    has_add_to_wishlist = True
-            except:
-                pass
-            
-            # Fallback to page source search (only for cart and bag, not basket)
-            if not has_add_to_cart and not has_add_to_bag and not has_add_to_basket_enabled and not has_add_to_wishlist:
-                has_add_to_cart = 'add to cart' in page_source
-                has_add_to_bag = 'add to bag' in page_source
-                has_add_to_wishlist = 'add to wishlist' in page_source
-            
-            # Determine stock status (prioritize "add to cart", "add to bag", or enabled "add to basket")
-            if has_add_to_cart or has_add_to_bag or has_add_to_basket_enabled:
-                return 'in_stock'
-            elif has_add_to_wishlist:
-                return 'out_of_stock'
-            else:
-                return 'unknown'
-                
-        except TimeoutException:
-            return 'error: Page load timeout'
-        except WebDriverException as e:
-            error_msg = str(e).lower()
-            if 'chrome' in error_msg or 'chromedriver' in error_msg:
-                return f'error: ChromeDriver issue - Check installation and version match Chrome browser'
-            return f'error: Browser error - {str(e)[:60]}'
-        except Exception as e:
-            return f'error: {str(e)[:50]}'
-        finally:
-            # Always close the driver
-            if driver:
-                try:
-                    driver.quit()
-                except:
-                    pass
-            
-    def update_tab_color(self, tab_index, color):
+    def update_tab_color(self, target_id, color):
         """Update the tab background color"""
         try:
             # Create a custom style for this tab
             style = ttk.Style()
-            style_name = f"Monitor{tab_index}.TLabel"
+            style_name = f"Monitor{target_id}.TLabel"
             
             if color == "green":
                 style.configure(style_name, background="green", foreground="white")
@@ -358,137 +3516,201 @@ class StockMonitor:
         except:
             pass
     
-    def show_refresh_indicator(self, tab_index, show=True):
-        """Show or hide the refresh indicator - must be called from main thread"""
-        def update():
-            try:
-                if show:
-                    self.refresh_labels[tab_index].config(text="🔄 Refreshing...")
-                    self.refresh_labels[tab_index].pack(fill="x", padx=10, pady=(5, 0))
-                else:
-                    self.refresh_labels[tab_index].config(text="")
-                    self.refresh_labels[tab_index].pack_forget()
-            except:
-                pass
-        
-        # Schedule the update on the main thread
-        self.root.after(0, update)
-    
-    def send_email_alert(self, tab_index, url):
-        """Send email alert when product comes in stock"""
+    def flush_updates(self):
+        """Apply everything the engine reported since the last tick, then schedule the next one"""
         try:
-            # Check if we should send email based on interval
-            current_time = time.time()
-            email_interval = self.config.get('email_interval', 300)
-            
-            if tab_index in self.last_email_sent:
-                if current_time - self.last_email_sent[tab_index] < email_interval:
-                    return
-                    
-            msg = MIMEMultipart()
-            msg['From'] = self.config['email_from']
-            msg['To'] = self.config['email_to']
-            msg['Subject'] = f'Stock Alert - Monitor {tab_index + 1}'
-            
-            body = f"""
-            Product is now IN STOCK!
-            
-            Monitor: {tab_index + 1}
-            URL: {url}
-            Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-            
-            Check it out now!
-            """
-            
-            msg.attach(MIMEText(body, 'plain'))
-            
-            server = smtplib.SMTP(self.config.get('smtp_server', 'smtp.gmail.com'), 
-                                 self.config.get('smtp_port', 587))
-            server.starttls()
-            server.login(self.config['email_from'], self.config['email_password'])
-            server.send_message(msg)
-            server.quit()
-            
-            self.last_email_sent[tab_index] = current_time
+            for target_id, changes in self.bus.drain().items():
+                # Monitors added or removed behind our back, e.g. by editing the config file
+                target = self.engine.targets.get(target_id)
+                if target is None or changes.pop('membership', None) == 'removed':
+                    if target_id in self.rendered:
+                        self.drop_monitor(target_id)
+                    continue
+                if target_id not in self.rendered:
+                    self.create_monitor(target)
+                if changes.pop('updated', False):
+                    self.refresh_entries(target)
+                if changes:
+                    self.states.setdefault(target_id, {}).update(changes)
+                self.render(target)
+        finally:
+            self.root.after(self.tick_ms, self.flush_updates)
             
-        except Exception as e:
-            print(f"Email error: {str(e)}")
+    def render(self, target):
+        """Bring a monitor's widgets in line with its state, touching only those that changed"""
+        state = self.states.get(target.id, {})
+        running = target.running
+        current = (running, running and state.get('checking', False), state.get('status') if running else None,
+                   target.name, target.url, target.interval)
+        previous = self.rendered.get(target.id)
+        if current == previous:
+            return
+        self.rendered[target.id] = current
+        try:
+            if self.table is not None:
+                self.render_row(target, current, previous)
+            else:
+                self.render_tab(target, current, previous)
+        except:
+            pass
             
-    def monitor_loop(self, tab_index):
-        """Main monitoring loop for a tab"""
-        url = self.url_entries[tab_index].get()
-        interval = int(self.interval_entries[tab_index].get())
+    def render_row(self, target, current, previous):
+        running, checking, status, name, url, interval = current
+        if not running:
+            text, tag = ("Monitoring stopped" if target.id in self.states else "Not monitoring"), ()
+        elif status is None:
+            text, tag = "Starting monitoring...", ()
+        elif status == 'in_stock':
+            text, tag = "✓ IN STOCK", ('in_stock',)
+        elif status == 'out_of_stock':
+            text, tag = "✗ OUT OF STOCK", ('out_of_stock',)
+        else:
+            text, tag = f"⚠ {status}", ('error',)
+        if checking:
+            text = f"🔄 {text}"
+        self.table.item(target.id, values=(name, text, interval, url), tags=tag)
         
-        while self.monitoring_threads.get(tab_index, {}).get('running', False):
-            # Show refresh indicator
-            self.show_refresh_indicator(tab_index, True)
-            
-            status = self.check_stock(url)
-            
-            # Hide refresh indicator
-            self.show_refresh_indicator(tab_index, False)
-            
-            # Update UI - use root.after to ensure main thread updates
-            def update_ui():
-                try:
-                    if status == 'in_stock':
-                        self.status_labels[tab_index].config(text="IN STOCK - Add to Cart/Bag/Basket Available!", 
-                                                             bg="green", fg="white")
-                        # Update tab with green indicator - using text symbols instead of emoji
-                        self.notebook.tab(tab_index, text=f"✓ [IN STOCK] Monitor {tab_index + 1}")
-                        
-                        # Send email if status changed
-                        if self.last_status.get(tab_index) != 'in_stock':
-                            threading.Thread(target=self.send_email_alert, args=(tab_index, url), daemon=True).start()
-                            
-                    elif status == 'out_of_stock':
-                        self.status_labels[tab_index].config(text="OUT OF STOCK - Add to Wishlist Only", 
-                                                             bg="red", fg="white")
-                        # Update tab with red indicator
-                        self.notebook.tab(tab_index, text=f"✗ [OUT] Monitor {tab_index + 1}")
-                    else:
-                        self.status_labels[tab_index].config(text=f"Status: {status}", 
-                                                             bg="orange", fg="white")
-                        # Update tab with warning indicator for errors/unknown
-                        self.notebook.tab(tab_index, text=f"⚠ [ERROR] Monitor {tab_index + 1}")
-                except:
-                    pass
-                                                     
-            self.root.after(0, update_ui)
-            self.last_status[tab_index] = status
+    def render_tab(self, target, current, previous):
+        running, checking, status, name = current[:4]
+        previous = previous or (None, False, None, None, None, None)
+        target_id = target.id
+        
+        if checking != previous[1]:
+            refresh_label = self.refresh_labels[target_id]
+            if checking:
+                refresh_label.config(text="🔄 Refreshing...")
+                refresh_label.pack(fill="x", padx=10, pady=(5, 0))
+            else:
+                refresh_label.config(text="")
+                refresh_label.pack_forget()
+                
+        if (running, status, name) == (previous[0], previous[2], previous[3]):
+            return
+        if running != previous[0]:
+            self.start_buttons[target_id].config(state="disabled" if running else "normal")
+            self.stop_buttons[target_id].config(state="normal" if running else "disabled")
             
-            time.sleep(interval)
+        status_label = self.status_labels[target_id]
+        tab = self.tab_frames[target_id]
+        if not running:
+            status_label.config(text="Monitoring stopped" if target_id in self.states else "Not monitoring",
+                                bg="gray", fg="white")
+            self.notebook.tab(tab, text=name)
+        elif status is None:
+            status_label.config(text="Starting monitoring...", bg="blue", fg="white")
+            self.notebook.tab(tab, text=name)
+        elif status == 'in_stock':
+            status_label.config(text="IN STOCK - Add to Cart/Bag/Basket Available!", bg="green", fg="white")
+            # Update tab with green indicator - using text symbols instead of emoji
+            self.notebook.tab(tab, text=f"✓ [IN STOCK] {name}")
+        elif status == 'out_of_stock':
+            status_label.config(text="OUT OF STOCK - Add to Wishlist Only", bg="red", fg="white")
+            # Update tab with red indicator
+            self.notebook.tab(tab, text=f"✗ [OUT] {name}")
+        else:
+            status_label.config(text=f"Status: {status}", bg="orange", fg="white")
+            # Update tab with warning indicator for errors/unknown
+            self.notebook.tab(tab, text=f"⚠ [ERROR] {name}")
             
-    def start_monitoring(self, tab_index):
+    def start_monitoring(self, target_id, warn=True):
         """Start monitoring a tab"""
-        url = self.url_entries[tab_index].get()
+        url, interval = self.entered_settings(target_id)
         
         if not url:
             messagebox.showerror("Error", "Please enter a URL first!")
             return
             
-        if not self.config.get('email_from') or not self.config.get('email_password'):
+        try:
+            interval = int(interval)
+        except ValueError:
+            messagebox.showerror("Error", "Invalid interval value. Please enter numbers only.")
+            return
+            
+        if warn and (not self.config.get('email_from') or not self.config.get('email_password')):
             messagebox.showwarning("Warning", "Email settings not configured. Monitoring will work but no alerts will be sent.")
             
-        self.monitoring_threads[tab_index] = {'running': True}
-        thread = threading.Thread(target=self.monitor_loop, args=(tab_index,), daemon=True)
-        thread.start()
-        
-        self.start_buttons[tab_index].config(state="disabled")
-        self.stop_buttons[tab_index].config(state="normal")
-        self.status_labels[tab_index].config(text="Starting monitoring...", bg="blue", fg="white")
+        self.engine.update_target(target_id, url=url, interval=interval)
+        self.engine.start_target(target_id)
+        self.states[target_id] = {}
+        self.render(self.engine.targets[target_id])
         
-    def stop_monitoring(self, tab_index):
+    def stop_monitoring(self, target_id):
         """Stop monitoring a tab"""
-        if tab_index in self.monitoring_threads:
-            self.monitoring_threads[tab_index]['running'] = False
+        self.engine.stop_target(target_id)
+        self.render(self.engine.targets[target_id])
+        
+    def on_close(self):
+        """Shut down the engine (or detach from a daemon) before exiting"""
+        self.engine.shutdown()
+        self.root.destroy()
+
+def load_tkinter():
+    """Import tkinter only when a window is actually wanted"""
+    global tk, ttk, messagebox
+    import tkinter as tk
+    from tkinter import ttk, messagebox
+
+
+def run_daemon(engine):
+    """Run the engine headless until SIGINT/SIGTERM"""
+    stop = threading.Event()
+    
+    def handle_signal(signum, frame):
+        print(f"Received signal {signum}, shutting down...")
+        stop.set()
+        
+    for name in ('SIGINT', 'SIGTERM', 'SIGBREAK'):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), handle_signal)
             
-        self.start_buttons[tab_index].config(state="normal")
-        self.stop_buttons[tab_index].config(state="disabled")
-        self.status_labels[tab_index].config(text="Monitoring stopped", bg="gray", fg="white")
-        self.notebook.tab(tab_index, text=f"Monitor {tab_index + 1}")
+    engine.autostart = True
+    engine.start()
+    for target in list(engine.targets.values()):
+        if target.url and target.enabled:
+            engine.start_target(target.id)
+    print(f"Monitoring {sum(1 for t in engine.targets.values() if t.running)} target(s)")
+    
+    # Wake up regularly so signals are handled promptly on every platform
+    while not stop.wait(1):
+        pass
+    engine.shutdown()
 
-if __name__ == "__main__":
+
+def run_gui(engine):
+    """Show the Tk window as a view onto an engine"""
+    load_tkinter()
     root = tk.Tk()
-    app = StockMonitor(root)
-    root.mainloop()
\ No newline at end of file
+    StockMonitor(root, engine)
+    root.mainloop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch product pages and email when they come back in stock.")
+    parser.add_argument('--config', default='config.json', help="Path to the JSON config file")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--daemon', action='store_true',
+                      help="Run headless: start every enabled target from the config and run until signalled")
+    mode.add_argument('--attach', metavar='URL',
+                      help="Open the GUI on a daemon that is already running, e.g. http://127.0.0.1:9464 "
+                           "(the daemon needs \"control\": {\"enabled\": true} in its config)")
+    parser.add_argument('--token-file',
+                        help="Control token written by the daemon (default: control_token beside the config)")
+    args = parser.parse_args(argv)
+    
+    if args.attach:
+        try:
+            with open(args.token_file or control_token_path(args.config)) as f:
+                token = f.read().strip()
+        except OSError as e:
+            parser.error(f"can't read the control token: {e}")
+        run_gui(RemoteEngine(args.attach, token))
+    elif args.daemon:
+        run_daemon(MonitorEngine(args.config))
+    else:
+        run_gui(MonitorEngine(args.config))
+
+
+if __name__ == "__main__":
+    # Worker processes of a frozen (pyinstaller) build start through here too
+    multiprocessing.freeze_support()
+    main()